@@ -3,13 +3,108 @@
 # pylint:  disable=missing-docstring
 # pylint:  disable=too-few-public-methods
 
+from copy import deepcopy
+
 from archivist.archivist import Archivist as _Archivist
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .about import __version__ as VERSION
 from .constants import USER_AGENT_PREFIX
+from .testing.rate_limit import TokenBucket
+
+POOL_SIZE = 10
+MAX_RETRIES = 0
+BACKOFF = 0.0
+
+# 429 is retried by the SDK itself
+RETRY_STATUSES = (502, 503, 504)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request and
+    optionally waits for a token from limiter before each one
+    """
+
+    def __init__(self, *args, timeout=None, limiter=None, **kwargs):
+        self.timeout = timeout
+        self.limiter = limiter
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        return super().send(request, *args, **kwargs)
+
+
+def pooled_session(
+    *,
+    pool_size=POOL_SIZE,
+    max_retries=MAX_RETRIES,
+    backoff=BACKOFF,
+    timeout=None,
+    keep_alive=True,
+    verify=True,
+    rate=None,
+):
+    """
+    Session that keeps up to pool_size connections per host alive and
+    shares them between threads. Threads wait for a free connection rather
+    than opening (and then discarding) extra ones.
+
+    Connection errors and 502/503/504 responses to idempotent requests are
+    retried max_retries times with exponential backoff. timeout (seconds)
+    applies to every request that does not specify its own.
+
+    If rate is given all the threads together make at most rate requests
+    per second.
+    """
+    retries = Retry(
+        total=max_retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=retries,
+        timeout=timeout,
+        limiter=TokenBucket(rate) if rate else None,
+    )
+
+    session = Session()
+    session.verify = verify
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
 
 
 class Archivist(_Archivist):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, session=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.user_agent = f"{USER_AGENT_PREFIX}{VERSION}"
+        if session is not None:
+            self._session = session
+
+    def __copy__(self):
+        # unlike the SDK the copy is also a samples Archivist and it shares
+        # the session (and so the connection pool) of the original
+        return Archivist(
+            self.url,
+            self.auth,
+            fixtures=deepcopy(self.fixtures),
+            verify=self.verify,
+            max_time=self.max_time,
+            partner_id=self.partner_id,
+            session=self.session,
+        )
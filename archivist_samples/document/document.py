@@ -3,8 +3,6 @@
 # pylint:disable=missing-class-docstring      # docstrings
 # pylint:disable=too-many-positional-arguments
 
-import importlib.resources as res
-
 import logging
 
 from copy import copy
@@ -16,6 +14,7 @@ from typing import TYPE_CHECKING
 
 from . import document_files
 from ..testing.assets import make_assets_create, AttachmentDescription
+from ..testing.uploads import upload_from_package
 
 if TYPE_CHECKING:
     from ..archivist import Archivist
@@ -24,37 +23,32 @@ LOGGER = logging.getLogger(__name__)
 
 
 def upload_attachment(arch, attachment_description: AttachmentDescription):
-    with res.files(document_files).joinpath(attachment_description.filename).open(
-        "rb"
-    ) as fd:
-        blob = arch.attachments.upload(fd)
-        attachment = {
-            # sample-specific attr to relay attachment name
-            "datatrails_samples_display_name": attachment_description.attribute_name,
-            "arc_file_name": attachment_description.filename,
-            "arc_attribute_type": "arc_attachment",
-            "arc_blob_identity": blob["identity"],
-            "arc_blob_hash_alg": blob["hash"]["alg"],
-            "arc_blob_hash_value": blob["hash"]["value"],
-        }
-        return attachment
+    blob = upload_from_package(arch, document_files, attachment_description.filename)
+    attachment = {
+        # sample-specific attr to relay attachment name
+        "datatrails_samples_display_name": attachment_description.attribute_name,
+        "arc_file_name": attachment_description.filename,
+        "arc_attribute_type": "arc_attachment",
+        "arc_blob_identity": blob["identity"],
+        "arc_blob_hash_alg": blob["hash"]["alg"],
+        "arc_blob_hash_value": blob["hash"]["value"],
+    }
+    return attachment
 
 
 def attachment_create(arch, attachment_description: AttachmentDescription):
-    with res.files(document_files).joinpath(attachment_description.filename).open(
-        "rb"
-    ) as fd:
-        attachment = arch.attachments.upload(fd)
-        result = {
-            "arc_attribute_type": "arc_attachment",
-            "arc_blob_identity": attachment["identity"],
-            "arc_blob_hash_alg": attachment["hash"]["alg"],
-            "arc_blob_hash_value": attachment["hash"]["value"],
-            "arc_display_name": attachment_description.attribute_name,
-            "arc_file_name": attachment_description.filename,
-        }
-
-        return result
+    attachment = upload_from_package(
+        arch, document_files, attachment_description.filename
+    )
+    result = {
+        "arc_attribute_type": "arc_attachment",
+        "arc_blob_identity": attachment["identity"],
+        "arc_blob_hash_alg": attachment["hash"]["alg"],
+        "arc_blob_hash_value": attachment["hash"]["value"],
+        "arc_display_name": attachment_description.attribute_name,
+        "arc_file_name": attachment_description.filename,
+    }
+    return result
 
 
 document_creator = make_assets_create(
@@ -14,7 +14,7 @@ from .run import run
 LOGGER = logging.getLogger(__name__)
 
 
-def main():
+def make_parser():
     parser = common_parser("Document Sample")
     parser.add_argument(
         "--namespace",
@@ -25,6 +25,11 @@ def main():
         help="namespace of item population (to enable parallel demos)",
     )
 
+    return parser
+
+
+def main():
+    parser = make_parser()
     args = parser.parse_args()
 
     poc = common_endpoint("document", args)
@@ -14,7 +14,7 @@ from .run import run
 LOGGER = logging.getLogger(__name__)
 
 
-def main():
+def make_parser():
     parser = common_parser("Exercises the various Wavestone door entry use cases")
     parser.add_argument(
         "--namespace",
@@ -65,6 +65,11 @@ def main():
         help='open "door_id" with "card_id"',
     )
 
+    return parser
+
+
+def main():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("door_entry", args)
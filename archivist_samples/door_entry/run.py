@@ -15,7 +15,13 @@ from archivist.errors import ArchivistNotFoundError
 from .images import assets as images_assets
 from .images import events as images_events
 
-from ..testing.assets import make_assets_create, AttachmentDescription
+from ..testing.assets import (
+    make_assets_bulk_create,
+    make_assets_create,
+    AssetSpec,
+    AttachmentDescription,
+)
+from ..testing.uploads import upload_from_package
 
 
 DOOR_TERMINAL = "Door access terminal"
@@ -29,19 +35,17 @@ LOGGER = logging.getLogger(__name__)
 
 
 def attachment_create(doors, attachment_description: AttachmentDescription):
-    with res.files(images_assets).joinpath(attachment_description.filename).open(
-        "rb"
-    ) as fd:
-        attachment = doors.attachments.upload(fd)
-        result = {
-            "arc_attribute_type": "arc_attachment",
-            "arc_blob_identity": attachment["identity"],
-            "arc_blob_hash_alg": attachment["hash"]["alg"],
-            "arc_blob_hash_value": attachment["hash"]["value"],
-            "arc_file_name": attachment_description.filename,
-        }
-
-        return result
+    attachment = upload_from_package(
+        doors, images_assets, attachment_description.filename
+    )
+    result = {
+        "arc_attribute_type": "arc_attachment",
+        "arc_blob_identity": attachment["identity"],
+        "arc_blob_hash_alg": attachment["hash"]["alg"],
+        "arc_blob_hash_value": attachment["hash"]["value"],
+        "arc_file_name": attachment_description.filename,
+    }
+    return result
 
 
 doors_creator = make_assets_create(attachment_creator=attachment_create)
@@ -186,7 +190,7 @@ def create_doors(doors):
 ############
 
 
-cards_creator = make_assets_create()
+cards_creator = make_assets_bulk_create()
 
 
 def create_cards(cards):
@@ -197,15 +201,24 @@ def create_cards(cards):
     # Similarly there's no real benefit to creating a
     # Primary_image for them so leave that empty too
     cards_map = {}
-    for i in range(5):
-        cards_map[f"access_card_{i}"] = cards_creator(
-            cards,
-            f"access_card_{i}",
-            {
-                "arc_serial_number": f"sc-x5-{i}",
-                "arc_description": f"Electronic door access card #{i}",
-            },
-        )
+    results = cards_creator(
+        cards,
+        [
+            AssetSpec(
+                f"access_card_{i}",
+                {
+                    "arc_serial_number": f"sc-x5-{i}",
+                    "arc_description": f"Electronic door access card #{i}",
+                },
+            )
+            for i in range(5)
+        ],
+    )
+    for result in results:
+        if result.error is not None:
+            raise result.error
+
+        cards_map[result.spec.display_name] = (result.asset, result.existed)
 
     LOGGER.info("All cards created")
     return cards_map
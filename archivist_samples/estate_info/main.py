@@ -76,7 +76,7 @@ def run(poc, args):
     return 1
 
 
-def main():
+def make_parser():
     parser = common_parser("Get basic information about your DataTrails estate")
 
     # per example exclusive options here
@@ -98,6 +98,11 @@ def main():
         help="cross-check total event count against assets",
     )
 
+    return parser
+
+
+def main():
+    parser = make_parser()
     args = parser.parse_args()
 
     poc = common_endpoint("estate_info", args)
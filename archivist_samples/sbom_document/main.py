@@ -14,7 +14,7 @@ from .run import run
 LOGGER = logging.getLogger(__name__)
 
 
-def main():
+def make_parser():
     parser = common_parser(
         "Simple SBOM implementation that conforms with NTIA recommendations"
     )
@@ -27,6 +27,11 @@ def main():
         help="namespace of item population (to enable parallel demos",
     )
 
+    return parser
+
+
+def main():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("sbom", args)
@@ -4,8 +4,6 @@
 # pylint:disable=unused-import      # To prevent cyclical import errors forward referencing is used
 # pylint:disable=cyclic-import      # but pylint doesn't understand this feature
 
-import importlib.resources as res
-
 import logging
 from sys import exit as sys_exit
 from typing import List, Optional
@@ -13,6 +11,7 @@ from typing import List, Optional
 from .. import archivist as type_helper
 
 from ..testing.assets import make_assets_create, AttachmentDescription
+from ..testing.uploads import upload_from_package
 
 from . import sbom_files
 
@@ -22,19 +21,16 @@ LOGGER = logging.getLogger(__name__)
 
 def attachment_create(arch, attachment_description: AttachmentDescription):
     LOGGER.info("sbom attachment creator: %s", attachment_description.filename)
-    with res.files(sbom_files).joinpath(attachment_description.filename).open(
-        "rb"
-    ) as fd:
-        attachment = arch.attachments.upload(fd)
-        result = {
-            "arc_attribute_type": "arc_attachment",
-            "arc_blob_identity": attachment["identity"],
-            "arc_blob_hash_alg": attachment["hash"]["alg"],
-            "arc_blob_hash_value": attachment["hash"]["value"],
-            "arc_display_name": attachment_description.attribute_name,
-            "arc_file_name": attachment_description.filename,
-        }
-        return result
+    attachment = upload_from_package(arch, sbom_files, attachment_description.filename)
+    result = {
+        "arc_attribute_type": "arc_attachment",
+        "arc_blob_identity": attachment["identity"],
+        "arc_blob_hash_alg": attachment["hash"]["alg"],
+        "arc_blob_hash_value": attachment["hash"]["value"],
+        "arc_display_name": attachment_description.attribute_name,
+        "arc_file_name": attachment_description.filename,
+    }
+    return result
 
 
 sboms_creator = make_assets_create(attachment_creator=attachment_create)
@@ -379,7 +379,7 @@ def run(arch, args):
     return 0
 
 
-def main():
+def make_parser():
     parser = common_parser(
         "Shows simple integration of a device private signing key with Archivist records"
     )
@@ -428,6 +428,11 @@ def main():
     # Required args
     parser.add_argument("asset_name")
 
+    return parser
+
+
+def main():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("signed_records", args)
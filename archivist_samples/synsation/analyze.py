@@ -5,10 +5,13 @@
 # pylint: disable=logging-fstring-interpolation
 
 
-from datetime import datetime, timezone
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import logging
 from sys import exit as sys_exit
 from sys import stdout as sys_stdout
+from threading import Lock
 
 from archivist import about
 from archivist.timestamp import parse_timestamp
@@ -20,42 +23,210 @@ from ..testing.asset import (
     VULNERABILITY_ADDRESSED,
     VULNERABILITY_REPORT,
 )
+from ..testing.json_file import load_json, save_json
 from ..testing.parser import common_endpoint
 
-LOGGER = logging.getLogger(__name__)
+from .response_times import FLEET, PERCENTILES, ResponseTimes
 
+LOGGER = logging.getLogger(__name__)
 
-def analyze_matched_pairs(label, p1, p2, events):
-    if p1 in events and p2 in events:
-        matched = set(events[p1]).intersection(events[p2])
-        unmatched = set(events[p1]).difference(events[p2])
+# events waiting for their other half remembered per asset and pair type
+MAX_OPEN = 10000
 
-        LOGGER.info(f"There are {len(matched)} completed {label} events")
+# assets analysed between writes of the checkpoint
+CHECKPOINT_EVERY = 50
 
-        for cv in matched:
-            # Check how long it was outstanding
-            time_req = parse_timestamp(events[p1][cv]["timestamp_declared"])
-            time_resp = parse_timestamp(events[p2][cv]["timestamp_declared"])
+PAIRS = (
+    ("maintenance", MAINTENANCE_REQUEST, MAINTENANCE_PERFORMED),
+    ("firmware", VULNERABILITY_REPORT, VULNERABILITY_ADDRESSED),
+)
 
-            response_time = time_resp - time_req
-            LOGGER.info(f" --> Response time: {response_time}")
 
-        LOGGER.info(
-            f"There are {len(unmatched)} uncompleted {label} events outstanding"
+class PairMatcher:
+    """Matches requests with responses by correlation value as the events
+    arrive, in either order.
+
+    Only the events still waiting for their other half are kept and at most
+    max_open of them; beyond that the oldest are forgotten. Pairs are
+    assumed to have unique correlation values, which is the suggested
+    convention but not enforced by Archivist services.
+    """
+
+    def __init__(self, label, request, response, *, max_open=MAX_OPEN, state=None):
+        self.label = label
+        self.request = request
+        self.response = response
+        self.max_open = max_open
+        self.completed = 0
+        self.evicted = 0
+        # correlation value -> (display type, declared timestamp)
+        self._open = OrderedDict(state or ())
+
+    def add(self, etype, corval, timestamp):
+        """Returns the response time if the event completes a pair"""
+        other = self._open.pop(corval, None)
+        if other is not None and other[0] != etype:
+            self.completed += 1
+            if etype == self.response:
+                return parse_timestamp(timestamp) - parse_timestamp(other[1])
+
+            return parse_timestamp(other[1]) - parse_timestamp(timestamp)
+
+        self._open[corval] = (etype, timestamp)
+        if len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+            self.evicted += 1
+
+        return None
+
+    def outstanding(self):
+        """Declared timestamps of the requests still waiting for a response"""
+        return [ts for etype, ts in self._open.values() if etype == self.request]
+
+    def state(self):
+        return list(self._open.items())
+
+    def report(self, aname, stats=None, log=LOGGER):
+        if not self.completed and not self._open:
+            log.info(f"There are NO {self.label} events to analyse")
+            return
+
+        log.info(f"There are {self.completed} completed {self.label} events")
+        outstanding = self.outstanding()
+        log.info(
+            f"There are {len(outstanding)} uncompleted {self.label} events outstanding"
         )
         # Check how long it has been outstanding
         now = datetime.now(timezone.utc)
-        for cv in unmatched:
-            time_req = parse_timestamp(events[p1][cv]["timestamp_declared"])
+        for timestamp in outstanding:
+            outstanding_time = now - parse_timestamp(timestamp)
+            log.info(f" --> {aname} outstanding for {outstanding_time}")
+            if stats is not None:
+                stats.add(
+                    aname,
+                    self.label,
+                    outstanding_time.total_seconds(),
+                    completed=False,
+                )
+
+        if self.evicted:
+            log.warning(f"{self.evicted} unmatched {self.label} events were forgotten")
+
+
+class AssetLog:
+    """Holds the log messages of one asset until flush()"""
+
+    def __init__(self):
+        self._records = []
+
+    def debug(self, msg):
+        self._records.append((logging.DEBUG, msg))
+
+    def info(self, msg):
+        self._records.append((logging.INFO, msg))
+
+    def warning(self, msg):
+        self._records.append((logging.WARNING, msg))
+
+    def error(self, msg):
+        self._records.append((logging.ERROR, msg))
+
+    def flush(self):
+        for level, msg in self._records:
+            LOGGER.log(level, msg)
+
+        self._records = []
+
+
+class Checkpoint:
+    """Remembers how far the events of each asset have been analysed
+
+    For each asset it keeps the number of events, the newest
+    timestamp_accepted seen with the identities of the events accepted
+    then, and the events still waiting to be paired, so that the next run
+    skips unchanged assets and only analyses events it has not seen.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = Lock()
+        self._assets = load_json(path, "checkpoint")
+        self._unsaved = 0
+
+    def get(self, aid):
+        with self._lock:
+            return self._assets.get(aid)
+
+    def set(self, aid, state):
+        with self._lock:
+            self._assets[aid] = state
+            self._unsaved += 1
+            if self._unsaved >= CHECKPOINT_EVERY:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        save_json(self._path, self._assets)
+        self._unsaved = 0
+
+
+def match_events(
+    aname, events, matchers, watermark, seen=(), *, stats=None, log=LOGGER
+):
+    """
+    Pair the events as they arrive, skipping any accepted before watermark
+    and those accepted at watermark whose identities are in seen. Returns
+    the newest timestamp_accepted seen and the identities of the events
+    accepted then.
+    """
+    newest = parse_timestamp(watermark) if watermark is not None else None
+    since = newest
+    seen = set(seen)
+    at_newest = set(seen)
+    for event in events:
+        accepted = event.get("timestamp_accepted")
+        if accepted is not None:
+            accepted_at = parse_timestamp(accepted)
+            identity = event.get("identity")
+            if since is not None and (
+                accepted_at < since or (accepted_at == since and identity in seen)
+            ):
+                continue
+
+            if newest is None or accepted_at > newest:
+                newest = accepted_at
+                watermark = accepted
+                at_newest = set()
+
+            if accepted_at == newest:
+                at_newest.add(identity)
 
-            outstanding_time = now - time_req
-            LOGGER.info(f" --> Outstanding for {outstanding_time}")
+        try:
+            etype = event["event_attributes"]["arc_display_type"]
+            corval = event["event_attributes"]["arc_correlation_value"]
+        except KeyError:
+            log.debug("Couldn't get essential info for this event.")
+            continue
+
+        matcher = matchers.get(etype)
+        if matcher is None:
+            continue
+
+        response_time = matcher.add(etype, corval, event["timestamp_declared"])
+        if response_time is not None:
+            log.info(f" --> {aname} {matcher.label} response time: {response_time}")
+            if stats is not None:
+                stats.add(aname, matcher.label, response_time.total_seconds())
 
-    else:
-        LOGGER.info(f"There are NO {label} events to analyse")
+    return watermark, sorted(at_newest)
 
 
-def analyze_asset(conn, asset):
+def analyze_asset(  # pylint: disable=too-many-locals
+    conn, asset, checkpoint=None, stats=None, log=LOGGER
+):
     # Fetch basic asset info. If any of these fields is missing it's fatal...
     try:
         aid = asset["identity"]
@@ -67,69 +238,143 @@ def analyze_asset(conn, asset):
         adesc = attrs["arc_description"]
     except KeyError:
         # Some devices won't have this property.  Just ignore failures.
-        LOGGER.error("Malformed Asset.")
+        log.error("Malformed Asset.")
         return
 
-    LOGGER.info("<---------------------------------------->")
-    LOGGER.info(f"Analyzing {atype} '{aname}' (serial # {aserial})")
-    LOGGER.info(f'"{adesc}"')
-    LOGGER.info(f"Current Firmware Version: {aversion}")
+    log.info("<---------------------------------------->")
+    log.info(f"Analyzing {atype} '{aname}' (serial # {aserial})")
+    log.info(f'"{adesc}"')
+    log.info(f"Current Firmware Version: {aversion}")
 
     # Get all the events for this device
     number_of_events = conn.events.count(asset_id=aid)
     if number_of_events == 0:
-        LOGGER.debug("No events found for asset")
-        LOGGER.info("No events to analyse.")
+        log.debug("No events found for asset")
+        log.info("No events to analyse.")
         return
 
-    allevents = conn.events.list(asset_id=aid)
-    # Sort the events into paired buckets that we care about, keyed on
-    # the events' "correlation_value". Only works for unique pairs of
-    # correlation values, which is the suggested convention but not
-    # enforced by Archivist services
-    sortedevents = {}
-    for event in allevents:
-        try:
-            etype = event["event_attributes"]["arc_display_type"]
-            corval = event["event_attributes"]["arc_correlation_value"]
-        except KeyError:
-            LOGGER.debug("Couldn't get essential info for this event.")
-            continue
+    state = checkpoint.get(aid) if checkpoint is not None else None
+    if state is None:
+        state = {"count": 0, "watermark": None, "seen": [], "open": {}}
+    elif state["count"] == number_of_events:
+        log.info("No new events to analyse.")
+        return
 
-        if etype not in sortedevents:
-            sortedevents[etype] = {}
+    matchers = {}
+    for label, request, response in PAIRS:
+        matcher = PairMatcher(label, request, response, state=state["open"].get(label))
+        matchers[request] = matchers[response] = matcher
+
+    watermark, seen = match_events(
+        aname,
+        conn.events.list(asset_id=aid),
+        matchers,
+        state["watermark"],
+        state.get("seen", ()),
+        stats=stats,
+        log=log,
+    )
 
-        sortedevents[etype][corval] = event
+    # maintenance and vulnerability events
+    for _, request, _ in PAIRS:
+        matchers[request].report(aname, stats, log)
 
-    # Now we've got them all we can do the analysis
-    #  + Which events weren't fixed at all?
-    #  + For events that were fixed, how long did it take?
+    # Summarize TBD
+    log.info("---")
+
+    if checkpoint is not None:
+        checkpoint.set(
+            aid,
+            {
+                "count": number_of_events,
+                "watermark": watermark,
+                "seen": seen,
+                "open": {
+                    label: matchers[request].state() for label, request, _ in PAIRS
+                },
+            },
+        )
 
-    # maintenance events
-    analyze_matched_pairs(
-        "maintenance", MAINTENANCE_REQUEST, MAINTENANCE_PERFORMED, sortedevents
-    )
 
-    # vulnerability events
-    analyze_matched_pairs(
-        "firmware", VULNERABILITY_REPORT, VULNERABILITY_ADDRESSED, sortedevents
-    )
+def analyze_assets(arch, assets, jobs, checkpoint=None, stats=None):
+    """
+    Analyze the assets on a pool of jobs threads as the assets arrive.
+    The output of each asset is held back until the assets before it have
+    been reported, so it is in the same order as without threads.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        window = deque()
 
-    # Summarize TBD
-    LOGGER.info("---")
+        def report_next():
+            future, log = window.popleft()
+            future.result()
+            log.flush()
+
+        for asset in assets:
+            # keep a few assets queued for each thread but no more
+            if len(window) >= 2 * jobs:
+                report_next()
+
+            log = AssetLog()
+            window.append(
+                (
+                    executor.submit(analyze_asset, arch, asset, checkpoint, stats, log),
+                    log,
+                )
+            )
+
+        while window:
+            report_next()
+
+
+def report_summary(summary):
+    LOGGER.info("<---------------------------------------->")
+    for row in summary:
+        if row["asset"] != FLEET:
+            continue
+
+        LOGGER.info(
+            f"Fleet {row['type']}: {row['completed']} completed, "
+            f"{row['outstanding']} outstanding"
+        )
+        if row["completed"]:
+            times = ", ".join(
+                f"{name} {timedelta(seconds=round(row[name]))}"
+                for name in ("mean", *(f"p{p}" for p in PERCENTILES), "max")
+            )
+            LOGGER.info(f" --> {times}")
 
 
 def run(arch, args):
     LOGGER.info("Using version %s of datatrails-archivist", about.__version__)
     LOGGER.info("Fetching use case test assets namespace %s", args.namespace)
-    for asset in arch.assets.list():
-        analyze_asset(arch, asset)
+
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    stats = ResponseTimes()
+    try:
+        if args.jobs > 1:
+            analyze_assets(arch, arch.assets.list(), args.jobs, checkpoint, stats)
+        else:
+            for asset in arch.assets.list():
+                analyze_asset(arch, asset, checkpoint, stats)
+
+    finally:
+        if checkpoint is not None:
+            checkpoint.save()
+
+    summary = stats.summary()
+    report_summary(summary)
+    if args.export:
+        stats.export(args.export)
+
+    if args.summary:
+        stats.export_summary(args.summary, summary)
 
     LOGGER.info("Done.")
     sys_exit(0)
 
 
-def entry():
+def make_parser():
     parser = common_parser("Checks maintenance and update performance for assets")
     parser.add_argument(
         "--namespace",
@@ -139,7 +384,43 @@ def entry():
         default="synsation",
         help="namespace of item population (to enable parallel demos",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        action="store",
+        default=1,
+        help="analyze this many assets in parallel (see also --pool-size and --rate)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        dest="checkpoint",
+        action="store",
+        help="only analyze events newer than those seen by the last run "
+        "with the same checkpoint file",
+    )
+    parser.add_argument(
+        "--export",
+        type=str,
+        dest="export",
+        action="store",
+        help="write every response and outstanding time to this CSV file",
+    )
+    parser.add_argument(
+        "--summary",
+        type=str,
+        dest="summary",
+        action="store",
+        help="write response time statistics per asset and fleet to this CSV file",
+    )
 
+    return parser
+
+
+def entry():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("synsation", args)
@@ -3,11 +3,14 @@
 # including firmware issues
 
 
-# pylint:  disable=fixme
 # pylint:  disable=missing-docstring
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import logging
+import multiprocessing
+from queue import Empty
+import random
 from sys import exit as sys_exit
 from sys import stdout as sys_stdout
 import threading
@@ -16,100 +19,457 @@ import time
 from archivist import about
 
 from ..testing.archivist_parser import common_parser
+from ..testing.asset import EVENTS
+from ..testing.event_batcher import EventBatcher
+from ..testing.json_file import load_json, save_json
 from ..testing.parser import common_endpoint
-from ..testing.time_warp import TimeWarp
+from ..testing.time_warp import IDLE_SLEEP, Scheduler, TimeWarp
 
 from . import ev_charger_device
 from . import device_worker
 from . import recall_worker
+from .synsation_industries import SITE_ATTRIBUTE
 
 LOGGER = logging.getLogger(__name__)
 
+CHARGER_TYPE = "EV charging station"
 
-def initialize_devices(arch, airport):
-    ev_chargers = []
+# real seconds between the event counts sent by each shard
+SHARD_REPORT_INTERVAL = 10.0
+
+# threads simulating the chargers of a shard if --workers is not given
+SHARD_WORKERS = 8
 
-    number_of_chargers = arch.assets.count(
-        attrs={"arc_display_type": "EV charging station"},
-    )
 
-    debugstr = (
-        f"Found {number_of_chargers} total chargers. "
-        f"Looking for any in site '{airport}'..."
+def discover_chargers(arch, airport):
+    """Yield the (name, identity) of each charger at airport as the pages
+    of assets arrive
+    """
+    for charger in arch.assets.list(
+        attrs={"arc_display_type": CHARGER_TYPE, SITE_ATTRIBUTE: airport},
+    ):
+        yield charger.name, charger["identity"]
+
+    # Chargers created before they were labelled with their site have to
+    # be whittled down by name. They are only looked for if there are any.
+    total = arch.assets.count(attrs={"arc_display_type": CHARGER_TYPE})
+    labelled = arch.assets.count(
+        attrs={"arc_display_type": CHARGER_TYPE, SITE_ATTRIBUTE: "*"}
     )
-    LOGGER.debug(debugstr)
+    if labelled >= total:
+        return
 
-    chargers_list = arch.assets.list(
-        attrs={"arc_display_type": "EV charging station"},
+    LOGGER.info(
+        "%d chargers are not labelled with their site. Looking for any in '%s'...",
+        total - labelled,
+        airport,
     )
-    # Whittle it down to just San Jose
-    for charger in chargers_list:
+    for charger in arch.assets.list(attrs={"arc_display_type": CHARGER_TYPE}):
         try:
+            if SITE_ATTRIBUTE in charger["attributes"]:
+                continue
+
             candidate = charger.name
             LOGGER.debug("Checking '%s'", candidate)
             if candidate.startswith(airport):
-                evc = ev_charger_device.EVDevice(candidate, charger["identity"])
-                evc.init_archivist_client(arch)
-                ev_chargers.append(evc)
+                yield candidate, charger["identity"]
         except KeyError:
             # Some devices won't have these properties.  Just ignore failures.
             LOGGER.debug("This asset doesn't have valid attributes. Ignoring.")
 
-    LOGGER.debug(
-        "Found %d devices in %s from %d total devices",
-        len(ev_chargers),
-        airport,
-        number_of_chargers,
-    )
-    return ev_chargers
+
+def find_chargers(arch, airport, cache=None):
+    """Yield the (name, identity) of each charger at airport as it is found
+
+    If cache is the path of a JSON file the chargers found are remembered
+    there and later runs do not look for them again.
+    """
+    cached = None
+    if cache is not None:
+        namespace = (
+            arch.fixtures.get("assets", {}).get("attributes", {}).get("arc_namespace")
+        )
+        key = f"{arch.url} {namespace} {airport}"
+        chargers = load_json(cache, "device cache")
+        cached = chargers.get(key)
+
+    found = []
+    for name, identity in cached or discover_chargers(arch, airport):
+        found.append((name, identity))
+        yield name, identity
+
+    LOGGER.debug("Found %d devices in %s", len(found), airport)
+    if cache is not None and not cached and found:
+        chargers[key] = found
+        save_json(cache, chargers)
+
+
+def make_devices(arch, chargers, batcher=None):
+    """Yield an EVDevice for each (name, identity) in chargers"""
+    fleet = ev_charger_device.EVFleet()
+    for name, identity in chargers:
+        evc = ev_charger_device.EVDevice(name, identity, fleet=fleet)
+        evc.init_archivist_client(arch, batcher=batcher)
+        yield evc
+
+
+def initialize_devices(arch, airport, batcher=None, cache=None):
+    """Yield an EVDevice for each charger at airport as it is found"""
+    return make_devices(arch, find_chargers(arch, airport, cache), batcher=batcher)
 
 
 def interrupt_listener_run_until(tw, stop):
     try:
-        while True:
-            # The worker threads are doing everything, so just leave this
-            # one to wait for keyboard interrupts and kill the daemons
-            time.sleep(1)
-
-            # TODO: this is inefficient - in theory we could pre-calculate
-            # when the timewarp will hit this value rather than checking it
-            # every time
-            if stop and tw.now() > stop:
-                LOGGER.info("DataTrails EV Charger example reached end time")
-                break
+        # The worker threads are doing everything, so just leave this
+        # one to wait for keyboard interrupts and kill the daemons
+        if not stop:
+            while True:
+                time.sleep(IDLE_SLEEP)
+
+        # sleep until the timewarp reaches the stop date
+        tw.sleep_until(stop)
+        LOGGER.info("DataTrails EV Charger example reached end time")
 
     except KeyboardInterrupt:
         LOGGER.info("DataTrails EV Charger example stopped")
 
 
-def run(arch, args):
+def run_scheduled(devices, tw, stop, *, workers=0, recall_workers=0, recalls=True):
+    # With virtual time everything happens on this thread as fast as
+    # DataTrails accepts the events, and the simulated time jumps from one
+    # event to the next.
+    # Otherwise this thread hands the due device actions to a fixed pool of
+    # workers, so the number of threads does not depend on the number of
+    # chargers.
+    # Without recalls no firmware recalls are issued to the chargers.
+    # Returns the number of chargers simulated.
+    executor = None
+    if workers and not tw.virtual:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="charger")
+
+    scheduler = Scheduler(tw, executor=executor, max_pending=workers or None)
+    chargers = []
+
+    def discover():
+        # the fleet ticks over the rows of the chargers found so far
+        for c in devices:
+            if c.row != len(chargers):
+                raise ValueError(f"{c.name} is not the next row of the fleet")
+
+            chargers.append(c)
+            if len(chargers) == 1:
+                device_worker.start(c.fleet, chargers, scheduler)
+
+        if not chargers:
+            scheduler.stop()
+
+    if tw.virtual:
+        discover()
+        if not chargers:
+            return 0
+
+        LOGGER.info("Beginning virtual time telemetry run until %s", stop)
+    else:
+        # the chargers start as soon as they are found
+        scheduler.schedule_after(0, discover)
+        LOGGER.info("Beginning telemetry run with %d workers", workers)
+        if stop:
+            LOGGER.info("Press Ctrl-C to exit, or will stop automatically at %s", stop)
+        else:
+            LOGGER.info("Press Ctrl-C to exit")
+
+    # recalls are reported in parallel unless the simulation is to repeat
+    fanout = None
+    if recalls and recall_workers and not tw.virtual:
+        fanout = recall_worker.RecallFanout(
+            tw, scheduler=scheduler, max_workers=recall_workers
+        )
+
+    if recalls:
+        recall_worker.start(chargers, scheduler, fanout=fanout)
+
+    try:
+        scheduler.run(until=stop)
+        if chargers:
+            LOGGER.info("DataTrails EV Charger example reached end time")
+
+    except KeyboardInterrupt:
+        LOGGER.info("DataTrails EV Charger example stopped at %s", tw.now())
+
+    finally:
+        if fanout is not None:
+            fanout.close()
+
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return len(chargers)
+
+
+def shard_main(index, chargers, args, start_ns, reports):
+    """Simulate some of the chargers in a process of their own
+
+    The number of events made so far is put on the reports queue every
+    SHARD_REPORT_INTERVAL seconds and once more, marked as done, at the end.
+    The recalls are issued by the coordinator, not by the shards.
+    """
+    arch = common_endpoint("synsation", args)
+    if args.seed is not None:
+        random.seed(args.seed + index)
+
+    tw = TimeWarp(
+        args.start_date,
+        args.fast_forward,
+        virtual=args.virtual_time,
+        start_ns=start_ns,
+    )
+
+    batcher = None
+    if args.batch_size:
+        batcher = EventBatcher(
+            arch, batch_size=args.batch_size, flush_interval=args.flush_interval
+        )
+
+    started = time.monotonic()
+    finished = threading.Event()
+
+    def report(done=False):
+        reports.put((index, EVENTS.total(), time.monotonic() - started, done))
+
+    def reporter():
+        while not finished.wait(SHARD_REPORT_INTERVAL):
+            report()
+
+    threading.Thread(target=reporter, daemon=True).start()
+    try:
+        run_scheduled(
+            make_devices(arch, chargers, batcher=batcher),
+            tw,
+            args.stop_date,
+            workers=args.workers or SHARD_WORKERS,
+            recalls=False,
+        )
+        if batcher is not None:
+            batcher.close()
+
+    finally:
+        finished.set()
+        report(done=True)
+
+
+def start_recalls(arch, chargers, tw, args):
+    """Issue the firmware recalls of all the chargers from this process
+
+    One recall loop covers every shard, so the rate of recalls does not
+    depend on the number of shards. The firmware versions of the chargers
+    are only changed by the patches, so they are kept here. Returns a
+    function that stops the recalls.
+    """
+    batcher = None
+    if args.batch_size:
+        batcher = EventBatcher(
+            arch, batch_size=args.batch_size, flush_interval=args.flush_interval
+        )
+
+    devices = list(make_devices(arch, chargers, batcher=batcher))
+    scheduler = Scheduler(tw)
+    fanout = None
+    if args.recall_workers and not tw.virtual:
+        fanout = recall_worker.RecallFanout(
+            tw, scheduler=scheduler, max_workers=args.recall_workers
+        )
+
+    recall_worker.start(devices, scheduler, fanout=fanout)
+    thread = threading.Thread(
+        target=scheduler.run, args=(args.stop_date,), name="recalls", daemon=True
+    )
+    thread.start()
+
+    def stop():
+        scheduler.stop()
+        thread.join()
+        if fanout is not None:
+            fanout.close()
+
+        if batcher is not None:
+            batcher.close()
+
+    return stop
+
+
+def log_shard_rates(counts, total_only=False):
+    events = sum(n for n, _ in counts.values())
+    rate = sum(n / seconds for n, seconds in counts.values() if seconds)
+    LOGGER.info("All shards: %d events (%.1f/s)", events, rate)
+    if total_only:
+        return
+
+    for index, (n, seconds) in sorted(counts.items()):
+        LOGGER.info(
+            "Shard %d: %d events in %.1fs (%.1f/s)",
+            index,
+            n,
+            seconds,
+            n / seconds if seconds else 0.0,
+        )
+
+
+def run_shards(arch, args):
+    # The chargers are dealt out between args.shards processes, each with
+    # its own connection to DataTrails and a TimeWarp with the same origin,
+    # so the simulation is not limited to one core by the GIL. This
+    # process issues the recalls and collects their event counts and logs
+    # the combined rate.
+    # Returns the number of chargers simulated.
+    chargers = list(find_chargers(arch, args.airport, cache=args.device_cache))
+    if not chargers:
+        return 0
+
+    shards = min(args.shards, len(chargers))
+    tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    processes = [
+        context.Process(
+            target=shard_main,
+            args=(index, chargers[index::shards], args, tw.start_ns, reports),
+            name=f"charger-shard-{index}",
+        )
+        for index in range(shards)
+    ]
+    for process in processes:
+        process.start()
+
+    LOGGER.info("Simulating %d chargers in %d processes", len(chargers), shards)
+    stop_recalls = start_recalls(arch, chargers, tw, args)
+    counts = {}
+    running = set(range(shards))
+    next_log = time.monotonic() + SHARD_REPORT_INTERVAL
+    try:
+        while running:
+            try:
+                index, events, seconds, done = reports.get(
+                    timeout=SHARD_REPORT_INTERVAL
+                )
+            except Empty:
+                # do not wait for shards that died without saying so
+                running &= {i for i, p in enumerate(processes) if p.is_alive()}
+                continue
+
+            counts[index] = (events, seconds)
+            if done:
+                running.discard(index)
+
+            if time.monotonic() >= next_log:
+                next_log += SHARD_REPORT_INTERVAL
+                log_shard_rates(counts, total_only=True)
+
+        LOGGER.info("DataTrails EV Charger example reached end time")
+
+    except KeyboardInterrupt:
+        # the shards get the interrupt too and stop by themselves
+        LOGGER.info("DataTrails EV Charger example stopped")
+
+    finally:
+        stop_recalls()
+        for process in processes:
+            process.join(SHARD_REPORT_INTERVAL)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+            if process.exitcode:
+                LOGGER.error("%s exited with %s", process.name, process.exitcode)
+
+    # pick up the final counts of shards that stopped early
+    while True:
+        try:
+            index, events, seconds, _ = reports.get_nowait()
+        except Empty:
+            break
+
+        counts[index] = (events, seconds)
+
+    log_shard_rates(counts)
+    return len(chargers)
+
+
+def run(arch, args):  # pylint: disable=too-many-branches
     """logic goes here"""
     # Stretch the timestamps in logs
     LOGGER.info("Using version %s of datatrails-archivist", about.__version__)
     LOGGER.info("Fetching use case test assets namespace %s", args.namespace)
 
+    if args.virtual_time and not args.stop_date:
+        LOGGER.info("A stop date is required with virtual time.  Aborting.")
+        sys_exit(1)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.shards > 1:
+        if not run_shards(arch, args):
+            LOGGER.info("No chargers found at airport %s.  Aborting.", args.airport)
+            sys_exit(1)
+
+        sys_exit(0)
+
     LOGGER.info("Creating time warp...")
 
-    tw = TimeWarp(args.start_date, args.fast_forward)
+    tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
+
+    batcher = None
+    if args.batch_size:
+        LOGGER.info("Batching events in groups of %d", args.batch_size)
+        batcher = EventBatcher(
+            arch, batch_size=args.batch_size, flush_interval=args.flush_interval
+        )
 
     # Find all hte devices we're interested in
     LOGGER.info("Initializing chargers...")
-    chargers = initialize_devices(arch, args.airport)
-    if not chargers:
-        LOGGER.info("No chargers found at airport %s.  Aborting.", args.airport)
-        sys_exit(1)
+    devices = initialize_devices(
+        arch, args.airport, batcher=batcher, cache=args.device_cache
+    )
+
+    if args.virtual_time or args.workers:
+        simulated = run_scheduled(
+            devices,
+            tw,
+            args.stop_date,
+            workers=args.workers,
+            recall_workers=args.recall_workers,
+        )
+        if batcher is not None:
+            batcher.close()
+
+        if not simulated:
+            LOGGER.info("No chargers found at airport %s.  Aborting.", args.airport)
+            sys_exit(1)
+
+        sys_exit(0)
 
     # Create worker threads:
-    #  - One thread for each of the devices to do their thing
+    #  - One thread for each of the devices to do their thing, started as
+    #    soon as the device is found
     #  - One thread to issue firmware recalls every now and again
     # Separate worker threads are kicked off for each maintenance
     # or firmware activity
-    for c in chargers:
+    chargers = []
+    for c in devices:
+        chargers.append(c)
         x = threading.Thread(target=device_worker.threadmain, args=(c, tw), daemon=True)
         x.start()
 
+    if not chargers:
+        LOGGER.info("No chargers found at airport %s.  Aborting.", args.airport)
+        sys_exit(1)
+
+    fanout = None
+    if args.recall_workers:
+        fanout = recall_worker.RecallFanout(tw, max_workers=args.recall_workers)
+
     x = threading.Thread(
-        target=recall_worker.threadmain, args=(chargers, tw), daemon=True
+        target=recall_worker.threadmain, args=(chargers, tw, fanout), daemon=True
     )
     x.start()
 
@@ -122,10 +482,14 @@ def run(arch, args):
         LOGGER.info("Press Ctrl-C to exit")
 
     interrupt_listener_run_until(tw, args.stop_date)
+    if batcher is not None:
+        # the device threads are still running so flush rather than close
+        batcher.flush()
+
     sys_exit(0)
 
 
-def entry():
+def make_parser():
     parser = common_parser(
         "Simulates usage and maintenance of electric vehicle chargers"
     )
@@ -183,7 +547,83 @@ def entry():
         default=3600,
         help="Fast forward time in event series (default: 1 second = 1 hour)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        dest="batch_size",
+        action="store",
+        default=0,
+        help="create events in batches of this size (default: no batching)",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        dest="flush_interval",
+        action="store",
+        default=1.0,
+        help="seconds before a partial batch of events is created",
+    )
+    parser.add_argument(
+        "--virtual-time",
+        dest="virtual_time",
+        action="store_true",
+        default=False,
+        help="simulate from start to stop date as fast as possible",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        action="store",
+        help="seed the simulation so that runs with virtual time repeat",
+    )
+    parser.add_argument(
+        "--device-cache",
+        type=str,
+        dest="device_cache",
+        action="store",
+        help="remember the chargers found at each airport in this JSON file",
+    )
+    parser.add_argument(
+        "--recall-workers",
+        type=int,
+        dest="recall_workers",
+        action="store",
+        default=0,
+        help=(
+            "threads reporting each recall to the chargers, e.g. "
+            f"{recall_worker.RECALL_WORKERS} (default: 0, one at a time "
+            "with each patch on its own thread)"
+        ),
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        dest="shards",
+        action="store",
+        default=1,
+        help=(
+            "split the chargers between this many processes, each simulating "
+            f"its share with --workers threads (default: {SHARD_WORKERS})"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        dest="workers",
+        action="store",
+        default=0,
+        help=(
+            "simulate all chargers with this many threads "
+            "(default: one thread per charger)"
+        ),
+    )
 
+    return parser
+
+
+def entry():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("synsation", args)
@@ -5,17 +5,46 @@
 
 
 import random
-import time
+
+from .ev_charger_device import CHARGE_UNITS, CUSTOMER_WAIT
+
+# seconds between steps of the fleet
+TICK = 1
+
+
+def charge(charger, timewarp):
+    # Charge up
+    charger.charge_job(random.randint(*CHARGE_UNITS), timewarp)
+
+    # Check if it needs servicing, and kick off a maintenance worker
+    # to attend to it if so
+    charger.service(timewarp)
+
+
+def record(charger, units, due, scheduler):
+    charger.record_charge(units, scheduler.tw)
+    if due:
+        charger.request_service(scheduler.tw, scheduler=scheduler)
+
+
+def tick(fleet, chargers, scheduler):
+    # One step of the whole fleet. The events of the chargers whose
+    # customers showed up are recorded by separate scheduled calls so
+    # that a pool of workers can make them concurrently
+    for row, units, due in fleet.tick(len(chargers)):
+        scheduler.schedule_after(0, record, chargers[row], units, due, scheduler)
+
+    start(fleet, chargers, scheduler)
+
+
+def start(fleet, chargers, scheduler):
+    # chargers[row] is the device for each row of the fleet and may grow
+    scheduler.schedule_after(TICK, tick, fleet, chargers, scheduler)
 
 
 def threadmain(charger, timewarp):
     while True:
         # Wait for a customer to show up
-        time.sleep(random.randint(1, 10))
-
-        # Charge up
-        charger.charge_job(random.randint(25, 99), timewarp)
+        timewarp.sleep(random.randint(*CUSTOMER_WAIT))
 
-        # Check if it needs servicing, and kick off a maintenance worker
-        # thread to attend to it if so
-        charger.service(timewarp)
+        charge(charger, timewarp)
@@ -4,34 +4,205 @@
 # pylint: disable=missing-docstring
 
 
+from array import array
+from collections import namedtuple
 import logging
+import random
 import threading
-import uuid
 
 from ..testing.asset import MyAsset
 
 from . import maintenance_worker
+from .util import random_uuid
 
 LOGGER = logging.getLogger(__name__)
 
+SERVICE_INTERVAL = 1000
+
+# minor versions per major version of the firmware
+FW_MINORS = 4
+
+# rows share this many locks between them
+LOCK_STRIPES = 64
+
+# seconds between customers at a charger, and the units they charge
+CUSTOMER_WAIT = (1, 10)
+CHARGE_UNITS = (25, 99)
+
+WAITS = range(CUSTOMER_WAIT[0], CUSTOMER_WAIT[1] + 1)
+UNITS = range(CHARGE_UNITS[0], CHARGE_UNITS[1] + 1)
+
+# the rows due at each of the next few ticks are kept in a ring of slots
+WHEEL_SLOTS = CUSTOMER_WAIT[1] + 1
+
+EVState = namedtuple("EVState", ["total_charge", "next_service", "fw_version"])
+
+
+class EVFleet:  # pylint: disable=too-many-instance-attributes
+    """State of a fleet of chargers held in columns
+
+    Each column is an array with one entry per charger, so a fleet of
+    100k chargers costs a few MB however it is used. EVDevice objects are
+    thin views of one row.
+
+    tick() advances the fleet by one second. It is plain Python, not a
+    vectorised step: each row is filed under the tick at which its next
+    customer arrives, so a tick only visits the rows that charge (about
+    one in five) rather than every row, but its cost still grows with the
+    size of the fleet.
+
+    Row r is guarded by lock r % LOCK_STRIPES of a fixed table, so the
+    number of locks does not grow with the fleet and chargers in different
+    stripes are updated concurrently. tick() holds one stripe at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stripes = tuple(threading.Lock() for _ in range(LOCK_STRIPES))
+        self._total_charge = array("q")
+        self._next_service = array("q")
+        self._fw_major = array("l")
+        self._fw_minor = array("l")
+        self._ticks = 0
+        # rows of each stripe whose next customer arrives at each tick,
+        # indexed by stripe then tick % WHEEL_SLOTS
+        self._due = tuple(
+            [array("l") for _ in range(WHEEL_SLOTS)] for _ in range(LOCK_STRIPES)
+        )
+
+    def __len__(self):
+        return len(self._total_charge)
+
+    def add(self):
+        """Add a new charger and return its row"""
+        with self._lock:
+            self._total_charge.append(0)
+            self._next_service.append(SERVICE_INTERVAL)
+            self._fw_major.append(1)
+            self._fw_minor.append(0)
+            row = len(self._total_charge) - 1
+            slot = (self._ticks + random.randint(*CUSTOMER_WAIT)) % WHEEL_SLOTS
+
+        with self.lock(row):
+            self._due[row % LOCK_STRIPES][slot].append(row)
+
+        return row
+
+    def lock(self, row):
+        """The lock that guards row"""
+        return self._stripes[row % LOCK_STRIPES]
+
+    def total_charge(self, row):
+        return self._total_charge[row]
+
+    def next_service(self, row):
+        return self._next_service[row]
+
+    def fw_version(self, row):
+        with self.lock(row):
+            return f"v{self._fw_major[row]}.{self._fw_minor[row]}"
+
+    def snapshot(self, row):
+        """Consistent copy of the state of row"""
+        with self.lock(row):
+            return EVState(
+                self._total_charge[row],
+                self._next_service[row],
+                f"v{self._fw_major[row]}.{self._fw_minor[row]}",
+            )
+
+    def charge(self, row, units):
+        """Add units to the total charge of row"""
+        with self.lock(row):
+            self._total_charge[row] += units
+
+    def service_due(self, row):
+        """
+        True if row has passed its service interval, in which case the
+        interval is moved on
+        """
+        with self.lock(row):
+            if self._total_charge[row] > self._next_service[row]:
+                self._next_service[row] += SERVICE_INTERVAL
+                return True
+
+        return False
+
+    def patch(self, row):
+        """Bump the firmware of row and return the new version"""
+        with self.lock(row):
+            # Simple Red-Hat style versioning
+            if self._fw_minor[row] == FW_MINORS - 1:
+                self._fw_major[row] += 1
+                self._fw_minor[row] = 0
+            else:
+                self._fw_minor[row] += 1
+
+            return f"v{self._fw_major[row]}.{self._fw_minor[row]}"
+
+    def tick(self, rows):
+        """Advance the first rows chargers by one second
+
+        Chargers whose customer has arrived charge a random number of
+        units. Returns (row, units, service due) for each of them.
+        """
+        with self._lock:
+            self._ticks += 1
+            now = self._ticks % WHEEL_SLOTS
+
+        total_charge = self._total_charge
+        next_service = self._next_service
+        charged = []
+        for stripe, due in zip(self._stripes, self._due):
+            with stripe:
+                arrived, due[now] = due[now], array("l")
+                waits = random.choices(WAITS, k=len(arrived))
+                units = random.choices(UNITS, k=len(arrived))
+                for row, wait, amount in zip(arrived, waits, units):
+                    if row >= rows:
+                        # not simulated yet, so its customer keeps waiting
+                        due[(now + 1) % WHEEL_SLOTS].append(row)
+                        continue
+
+                    due[(now + wait) % WHEEL_SLOTS].append(row)
+                    total_charge[row] += amount
+                    service = total_charge[row] > next_service[row]
+                    if service:
+                        next_service[row] += SERVICE_INTERVAL
+
+                    charged.append((row, amount, service))
+
+        return charged
+
 
 class EVDevice:
-    def __init__(self, name, aid):
+    __slots__ = (
+        "_name",
+        "_archivist_asset_identity",
+        "_fleet",
+        "_row",
+        "_archivist_client",
+        "_batcher",
+        "_emitters",
+    )
+
+    def __init__(self, name, aid, fleet=None):
         self._name = name
         self._archivist_asset_identity = aid
 
-        self._fw_version = [1, 0]
-        self._next_service = 1000
-        self._total_charge = 0
-
-        self._writelock = threading.RLock()
+        # a device on its own is a fleet of one
+        self._fleet = fleet if fleet is not None else EVFleet()
+        self._row = self._fleet.add()
 
         # Initialise this after creation
         self._archivist_client = None
+        self._batcher = None
+        self._emitters = None
 
-    def init_archivist_client(self, client):
+    def init_archivist_client(self, client, batcher=None):
         if self._archivist_client is None:
             self._archivist_client = client
+            self._batcher = batcher
 
     @property
     def name(self):
@@ -41,13 +212,53 @@ class EVDevice:
     def id(self):
         return self._archivist_asset_identity
 
+    @property
+    def fleet(self):
+        return self._fleet
+
+    @property
+    def row(self):
+        return self._row
+
     @property
     def total_charge(self):
-        return self._total_charge
+        return self._fleet.total_charge(self._row)
 
     @property
     def next_service(self):
-        return self._next_service
+        return self._fleet.next_service(self._row)
+
+    @property
+    def fw_version(self):
+        return self._fleet.fw_version(self._row)
+
+    def snapshot(self):
+        """Consistent copy of the state of the device for other threads"""
+        return self._fleet.snapshot(self._row)
+
+    def emitter(self, timewarp, who=None):
+        """MyAsset for the events sent by who, by default the device itself
+
+        One is kept for each sender and made again only if the TimeWarp
+        changes.
+        """
+        if who is None:
+            who = f"{self._archivist_asset_identity[7:]}@evc.m2m.synsation.io"
+
+        if self._emitters is None:
+            self._emitters = {}
+
+        emitter = self._emitters.get(who)
+        if emitter is None or emitter.tw is not timewarp:
+            emitter = self._emitters[who] = MyAsset(
+                self._archivist_client,
+                self._archivist_asset_identity,
+                timewarp,
+                who,
+                batcher=self._batcher,
+            )
+
+        return emitter
 
     @property
     def archivist_asset_identity(self):
@@ -57,71 +268,61 @@ class EVDevice:
     def archivist_client(self):
         return self._archivist_client
 
+    @property
+    def batcher(self):
+        return self._batcher
+
     def charge_job(self, units, timewarp):
         # Simulate charging: simply keep a record of how many units charged
+        self._fleet.charge(self._row, units)
+        self.record_charge(units, timewarp)
+
+    def record_charge(self, units, timewarp):
+        """Record a charge already added to the fleet"""
         LOGGER.info("Device %s charging %s units", self._name, units)
-        self._total_charge += units
-
-        MyAsset(
-            self._archivist_client,
-            self._archivist_asset_identity,
-            timewarp,
-            f"{self._archivist_asset_identity[7:]}@evc.m2m.synsation.io",
-        ).charge(
+        self.emitter(timewarp).charge(
             f"Device {self._name} charging {units} units",
             "Attestation receipt: 0xa765dd854b57334ab1f7322d2",
         )
 
-    def service(self, timewarp):
-        if self._total_charge > self._next_service:
-            # Clear the flag and update the service interval
-            self._next_service += 1000
+    def service(self, timewarp, scheduler=None):
+        # Clear the flag and update the service interval
+        if self._fleet.service_due(self._row):
+            self.request_service(timewarp, scheduler=scheduler)
 
-            # Log our request
-            LOGGER.info(
-                "!! %s Service interval reached (%s)", self.name, self._total_charge
-            )
-            corval = str(uuid.uuid4())
-            MyAsset(
-                self._archivist_client,
-                self._archivist_asset_identity,
-                timewarp,
-                f"{self._archivist_asset_identity[7:]}@evc.m2m.synsation.io",
-            ).service_required(
-                (
-                    f"Service interval reached after {self._total_charge} "
-                    f"units charged. Please service."
-                ),
-                corval,
-            )
+    def request_service(self, timewarp, scheduler=None):
+        """Record that the service interval was reached and call the crew"""
+        total_charge = self.snapshot().total_charge
 
-            # Call the maintenance crew
-            x = threading.Thread(
-                target=maintenance_worker.threadmain,
-                args=(self, corval, timewarp),
-                daemon=True,
-            )
-            x.start()
+        # Log our request
+        LOGGER.info("!! %s Service interval reached (%s)", self.name, total_charge)
+        corval = random_uuid()
+        self.emitter(timewarp).service_required(
+            (
+                f"Service interval reached after {total_charge} "
+                f"units charged. Please service."
+            ),
+            corval,
+        )
+
+        # Call the maintenance crew
+        if scheduler is not None:
+            maintenance_worker.schedule(scheduler, self, corval)
+            return
+
+        x = threading.Thread(
+            target=maintenance_worker.threadmain,
+            args=(self, corval, timewarp),
+            daemon=True,
+        )
+        x.start()
 
     def update_firmware(self, cve_str, cve_corval, timewarp):
         LOGGER.info("!! %s patching vulnerable firmware", self.name)
 
-        with self._writelock:
-            # Simple Red-Hat style versioning
-            if self._fw_version[1] == 3:
-                self._fw_version[0] += 1
-                self._fw_version[1] = 0
-            else:
-                self._fw_version[1] += 1
-
-            version = f"v{self._fw_version[0]}.{self._fw_version[1]}"
-            MyAsset(
-                self._archivist_client,
-                self._archivist_asset_identity,
-                timewarp,
-                "otaService@evcservicing.com",
-            ).update_firmware(
-                f"Responding to vulnerability '{cve_str}' with patch '{version}'",
-                version,
-                cve_corval,
-            )
+        version = self._fleet.patch(self._row)
+        self.emitter(timewarp, "otaService@evcservicing.com").update_firmware(
+            f"Responding to vulnerability '{cve_str}' with patch '{version}'",
+            version,
+            cve_corval,
+        )
@@ -11,7 +11,9 @@ from sys import stdout as sys_stdout
 from archivist import about
 
 from ..testing.archivist_parser import common_parser
+from ..testing.assets import AssetIndex
 from ..testing.parser import common_endpoint
+from ..testing.plan import Plan, PlanError
 
 from . import synsation_corporation
 from . import synsation_industries
@@ -29,27 +31,87 @@ def run(arch, args):
     LOGGER.info("Using version %s of datatrails-archivist", about.__version__)
     LOGGER.info("Fetching use case test assets namespace %s", args.namespace)
 
+    # resolve existing assets locally rather than one request per asset
+    index = AssetIndex() if args.asset_index else None
+
+    if args.parallel:
+        run_plan(arch, args, index)
+    else:
+        run_serial(arch, args, index)
+
+    # Wait for all assets to confirm before we do anything with them
+    if args.await_confirmation:
+        LOGGER.info("Wait for confirmation")
+        arch.assets.wait_for_confirmed()
+
+    sys_exit(0)
+
+
+def run_serial(arch, args, index):
     if args.create_corporation:
-        synsation_corporation.initialise_all(arch, args.num_assets, args.wait)
+        synsation_corporation.initialise_all(
+            arch,
+            args.num_assets,
+            args.wait,
+            index=index,
+            jobs=args.jobs,
+            rate=args.assets_per_second,
+            seed=args.seed,
+            resume=args.resume,
+        )
 
     if args.create_industries:
-        synsation_industries.initialise_all(arch)
+        synsation_industries.initialise_all(
+            arch, index=index, topology=args.industries_topology
+        )
 
     if args.create_manufacturing:
         synsation_manufacturing.initialise_all(arch)
 
     if args.create_smartcity:
-        synsation_smartcity.initialise_all(arch)
+        synsation_smartcity.initialise_all(
+            arch, index=index, topology=args.smartcity_topology
+        )
 
-    # Wait for all assets to confirm before we do anything with them
-    if args.await_confirmation:
-        LOGGER.info("Wait for confirmation")
-        arch.assets.wait_for_confirmed()
 
-    sys_exit(0)
+def run_plan(arch, args, index):
+    # all the images are uploaded first and each group of assets is
+    # created as soon as its images are available
+    plan = Plan(max_workers=args.parallel)
+    if args.create_corporation:
+        synsation_corporation.add_to_plan(
+            plan,
+            arch,
+            args.num_assets,
+            args.wait,
+            index=index,
+            jobs=args.jobs,
+            rate=args.assets_per_second,
+            seed=args.seed,
+            resume=args.resume,
+        )
 
+    if args.create_industries:
+        synsation_industries.add_to_plan(
+            plan, arch, index=index, topology=args.industries_topology, jobs=args.jobs
+        )
 
-def entry():
+    if args.create_manufacturing:
+        synsation_manufacturing.add_to_plan(plan, arch)
+
+    if args.create_smartcity:
+        synsation_smartcity.add_to_plan(
+            plan, arch, index=index, topology=args.smartcity_topology, jobs=args.jobs
+        )
+
+    try:
+        plan.run()
+    except PlanError as ex:
+        LOGGER.error("Initialisation failed: %s", ex)
+        sys_exit(1)
+
+
+def make_parser():
     parser = common_parser(
         "Populates a clean DataTrails tenancy with Synsation test data"
     )
@@ -112,6 +174,65 @@ def entry():
         default=0.0,
         help="add a delay between API calls (corporation only)",
     )
+    parser.add_argument(
+        "--assets-per-second",
+        type=float,
+        dest="assets_per_second",
+        action="store",
+        help="create corporation assets at this rate (overrides --wait)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        action="store",
+        help="seed the choice of corporation asset types so fleets repeat",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        dest="resume",
+        action="store",
+        help="FILE recording corporation progress so an interrupted run "
+        "resumes where it stopped",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        action="store",
+        default=1,
+        help=(
+            "threads creating the corporation assets and, with --parallel, "
+            "the industries and smart city assets of each task"
+        ),
+    )
+    parser.add_argument(
+        "--industries-topology",
+        type=str,
+        dest="industries_topology",
+        action="store",
+        default=synsation_industries.TOPOLOGY,
+        help="YAML FILE (or name of a packaged topology) of the EV chargers",
+    )
+    parser.add_argument(
+        "--smartcity-topology",
+        type=str,
+        dest="smartcity_topology",
+        action="store",
+        default=synsation_smartcity.TOPOLOGY,
+        help="YAML FILE (or name of a packaged topology) of the smart city devices",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        dest="parallel",
+        action="store",
+        default=0,
+        help="upload images and create groups of assets this many at a time "
+        "(default: one after another)",
+    )
     parser.add_argument(
         "--await-confirmation",
         dest="await_confirmation",
@@ -119,7 +240,19 @@ def entry():
         default=False,
         help="wait for all assets to be confirmed before exit",
     )
+    parser.add_argument(
+        "--asset-index",
+        dest="asset_index",
+        action="store_true",
+        default=False,
+        help="list existing assets once per type instead of checking each asset",
+    )
 
+    return parser
+
+
+def entry():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("synsation", args)
@@ -4,14 +4,26 @@
 # pylint: disable=missing-docstring
 
 import random
-import time
+
+
+def patch(charger, cve_str, cve_corval, timewarp):
+    # 1-in-4 chance of missing the patch
+    patched = random.randint(0, 3)
+    if patched:
+        charger.update_firmware(cve_str, cve_corval, timewarp)
+
+    return bool(patched)
+
+
+def schedule(scheduler, charger, cve_str, cve_corval):
+    # Wait a random time to simulate delays, maintenance window etc
+    scheduler.schedule_after(
+        random.randint(10, 20), patch, charger, cve_str, cve_corval, scheduler.tw
+    )
 
 
 def threadmain(charger, cve_str, cve_corval, timewarp):
     # Wait a random time to simulate delays, maintenance window etc
-    time.sleep(random.randint(10, 20))
+    timewarp.sleep(random.randint(10, 20))
 
-    # 1-in-4 chance of missing the patch
-    patch = random.randint(0, 3)
-    if patch:
-        charger.update_firmware(cve_str, cve_corval, timewarp)
+    patch(charger, cve_str, cve_corval, timewarp)
@@ -3,43 +3,188 @@
 
 # pylint: disable=missing-docstring
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import datetime
 import logging
 import random
-import time
 import threading
-import uuid
+import time
+from typing import List
 
-from ..testing.asset import MyAsset
+from ..testing.stats import percentile
+from ..testing.time_warp import Scheduler
 
 from . import patch_worker
+from .util import random_uuid
 
 LOGGER = logging.getLogger(__name__)
 
+# threads reporting a recall when a number is not given
+RECALL_WORKERS = 8
 
-def issue_recall(charger_list, cve_id, timewarp):
-    # !!! WARNING !!! There is no thread-safety here, make sure you
-    # always treat the devices as read-only.
-    # The main device thread takes care of updating the variables
-    LOGGER.info("!! Issuing recall")
 
-    # Inform everybody...
-    for charger in charger_list:
-        cve_corval = cve_id + str(uuid.uuid4())
-        MyAsset(
-            charger.archivist_client,
-            charger.archivist_asset_identity,
-            timewarp,
-            "VulnBot@synsation-industries.com",
-        ).report_vulnerability(
-            (
-                "Synsation Industries Large EV Chargers are vulnerable "
-                f"to {cve_id}. Upgrade as soon as possible."
-            ),
+def report_vulnerability(charger, cve_id, cve_corval, timewarp):
+    return charger.emitter(
+        timewarp, "VulnBot@synsation-industries.com"
+    ).report_vulnerability(
+        (
+            "Synsation Industries Large EV Chargers are vulnerable "
+            f"to {cve_id}. Upgrade as soon as possible."
+        ),
+        cve_id,
+        cve_corval,
+    )
+
+
+@dataclass
+class Recall:  # pylint: disable=too-many-instance-attributes
+    """Progress of one recall"""
+
+    cve_id: str
+    chargers: int
+    started: float = field(default_factory=time.monotonic)
+    reported: int = 0
+    # reports or patches that could not be posted
+    failed: int = 0
+    settled: int = 0
+    patched: int = 0
+    # warped seconds from report to patch
+    latencies: List[float] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class RecallFanout:
+    """Issues recalls to many chargers at once
+
+    The vulnerability reports are posted by a pool of max_workers threads
+    and each patch is an entry in the deadline heap of a Scheduler, so a
+    recall of any size uses a fixed number of threads. If no scheduler is
+    given one is run on a thread of its own, and the patches are carried
+    out by the same pool.
+
+    Each recall logs how fast its reports were posted and, once every
+    charger has been patched or has missed the patch, how long the
+    patches took.
+    """
+
+    def __init__(self, timewarp, *, scheduler=None, max_workers=RECALL_WORKERS):
+        self._tw = timewarp
+        self._max_workers = max(max_workers, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="recall"
+        )
+        self._scheduler = scheduler
+        if scheduler is None:
+            self._scheduler = Scheduler(timewarp, executor=self._executor)
+            threading.Thread(target=self._scheduler.run, daemon=True).start()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def issue(self, chargers, cve_id):
+        """Report cve_id to every charger and schedule their patches"""
+        LOGGER.info("!! Issuing recall of %d chargers", len(chargers))
+        recall = Recall(cve_id, len(chargers))
+        window = deque()
+        for charger in chargers:
+            # keep a few reports queued for each thread but no more
+            if len(window) >= 2 * self._max_workers:
+                window.popleft().result()
+
+            window.append(self._executor.submit(self._report, recall, charger))
+
+        while window:
+            window.popleft().result()
+
+        elapsed = time.monotonic() - recall.started
+        LOGGER.info(
+            "Recall %s: %d reports in %.2fs (%.1f/s)",
             cve_id,
+            recall.reported,
+            elapsed,
+            recall.reported / elapsed if elapsed else 0.0,
+        )
+        return recall
+
+    def _report(self, recall, charger):
+        cve_corval = recall.cve_id + random_uuid()
+        try:
+            report_vulnerability(charger, recall.cve_id, cve_corval, self._tw)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error("Recall %s: report failed: %s", recall.cve_id, ex)
+            self._settle(recall, failed=True)
+            return
+
+        with recall.lock:
+            recall.reported += 1
+
+        # Wait a random time to simulate delays, maintenance window etc
+        self._scheduler.schedule_after(
+            random.randint(10, 20),
+            self._patch,
+            recall,
+            charger,
             cve_corval,
+            self._tw.now(),
+        )
+
+    def _patch(self, recall, charger, cve_corval, reported):
+        try:
+            patched = patch_worker.patch(charger, recall.cve_id, cve_corval, self._tw)
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error("Recall %s: patch failed: %s", recall.cve_id, ex)
+            self._settle(recall, failed=True)
+            return
+
+        latency = (self._tw.now() - reported).total_seconds() if patched else None
+        self._settle(recall, latency=latency)
+
+    def _settle(self, recall, *, latency=None, failed=False):
+        with recall.lock:
+            recall.settled += 1
+            if failed:
+                recall.failed += 1
+
+            if latency is not None:
+                recall.patched += 1
+                recall.latencies.append(latency)
+
+            if recall.settled < recall.chargers:
+                return
+
+        latencies = sorted(recall.latencies)
+        LOGGER.info(
+            "Recall %s: %d of %d chargers patched (%d reports or patches failed), "
+            "patch latency median %s max %s",
+            recall.cve_id,
+            recall.patched,
+            recall.chargers,
+            recall.failed,
+            (
+                datetime.timedelta(seconds=percentile(latencies, 50))
+                if latencies
+                else None
+            ),
+            datetime.timedelta(seconds=latencies[-1]) if latencies else None,
         )
+
+
+def issue_recall(charger_list, cve_id, timewarp, scheduler=None):
+    # Only the fixed identity of the devices is read here. Their
+    # firmware is updated by the patch worker
+    LOGGER.info("!! Issuing recall")
+
+    # Inform everybody...
+    for charger in charger_list:
+        cve_corval = cve_id + random_uuid()
+        report_vulnerability(charger, cve_id, cve_corval, timewarp)
         # Schedule the patch
+        if scheduler is not None:
+            patch_worker.schedule(scheduler, charger, cve_id, cve_corval)
+            continue
+
         x = threading.Thread(
             target=patch_worker.threadmain,
             args=(charger, cve_id, cve_corval, timewarp),
@@ -48,12 +193,33 @@ def issue_recall(charger_list, cve_id, timewarp):
         x.start()
 
 
-def threadmain(chargers, timewarp):
+def step(chargers, scheduler, fanout=None):
+    # the next step is due even if this recall fails
+    start(chargers, scheduler, fanout=fanout)
+
+    # 1-in-4 chance of finding a vulnerability
+    secure = random.randint(0, 3)
+    if not secure:
+        cve = f"CVE-{str(scheduler.tw.now())}"
+        if fanout is not None:
+            fanout.issue(list(chargers), cve)
+        else:
+            issue_recall(chargers, cve, scheduler.tw, scheduler=scheduler)
+
+
+def start(chargers, scheduler, fanout=None):
+    scheduler.schedule_after(60, step, chargers, scheduler, fanout)
+
+
+def threadmain(chargers, timewarp, fanout=None):
     while True:
-        time.sleep(60)
+        timewarp.sleep(60)
 
         # 1-in-4 chance of finding a vulnerability
         secure = random.randint(0, 3)
         if not secure:
             cve = f"CVE-{str(datetime.datetime.now())}"
-            issue_recall(chargers, cve, timewarp)
+            if fanout is not None:
+                fanout.issue(list(chargers), cve)
+            else:
+                issue_recall(chargers, cve, timewarp)
@@ -0,0 +1,137 @@
+# WARNING: Proof of concept code: Not for release
+# Response time statistics for compliance/SLA verification
+
+# pylint:  disable=missing-docstring
+
+from array import array
+from collections import Counter
+import csv
+from threading import Lock
+
+from ..testing.stats import percentile
+
+PERCENTILES = (50, 90, 99)
+
+FLEET = "*"
+
+EXPORT_FIELDS = ("asset", "type", "status", "seconds")
+
+SUMMARY_FIELDS = (
+    "asset",
+    "type",
+    "completed",
+    "outstanding",
+    "mean",
+    *(f"p{p}" for p in PERCENTILES),
+    "max",
+)
+
+
+class ResponseTimes:
+    """Response times of completed pairs and ages of outstanding requests
+
+    Each time is one row of a set of columns, which take a few bytes per
+    pair, so a million events are summarised without holding any event.
+    Rows can be added from many threads.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._names = []  # asset and type names, indexed by the columns
+        self._codes = {}
+        self._asset = array("l")
+        self._type = array("l")
+        self._seconds = array("d")
+        self._completed = array("b")
+
+    def __len__(self):
+        return len(self._seconds)
+
+    def _code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._names)
+            self._names.append(name)
+
+        return code
+
+    def add(self, asset, label, seconds, *, completed=True):
+        """Record a response time or, if not completed, an outstanding time"""
+        with self._lock:
+            self._asset.append(self._code(asset))
+            self._type.append(self._code(label))
+            self._seconds.append(seconds)
+            self._completed.append(completed)
+
+    def rows(self):
+        """(asset, type, status, seconds) of every time recorded"""
+        names = self._names
+        with self._lock:
+            columns = (
+                self._asset[:],
+                self._type[:],
+                self._completed[:],
+                self._seconds[:],
+            )
+
+        for asset, label, completed, seconds in zip(*columns):
+            yield (
+                names[asset],
+                names[label],
+                "completed" if completed else "outstanding",
+                seconds,
+            )
+
+    def summary(self):
+        """
+        Statistics per asset and type, plus fleet-wide per type with FLEET
+        as the asset. Times are in seconds.
+        """
+        names = self._names
+        completed = {}
+        outstanding = Counter()
+        with self._lock:
+            columns = (
+                self._asset[:],
+                self._type[:],
+                self._completed[:],
+                self._seconds[:],
+            )
+
+        for asset, label, done, seconds in zip(*columns):
+            for key in ((names[asset], names[label]), (FLEET, names[label])):
+                if done:
+                    completed.setdefault(key, array("d")).append(seconds)
+                else:
+                    outstanding[key] += 1
+
+        summary = []
+        for key in sorted(set(completed) | set(outstanding)):
+            ordered = sorted(completed.get(key, ()))
+            row = dict(
+                zip(SUMMARY_FIELDS, (*key, len(ordered), outstanding[key])),
+            )
+            if ordered:
+                row["mean"] = sum(ordered) / len(ordered)
+                for p in PERCENTILES:
+                    row[f"p{p}"] = percentile(ordered, p)
+
+                row["max"] = ordered[-1]
+
+            summary.append(row)
+
+        return summary
+
+    def export(self, path):
+        """Write every time recorded to a CSV file"""
+        with open(path, mode="w", encoding="utf-8", newline="") as fd:
+            writer = csv.writer(fd)
+            writer.writerow(EXPORT_FIELDS)
+            writer.writerows(self.rows())
+
+    def export_summary(self, path, summary=None):
+        """Write the statistics to a CSV file"""
+        with open(path, mode="w", encoding="utf-8", newline="") as fd:
+            writer = csv.DictWriter(fd, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+            writer.writerows(summary if summary is not None else self.summary())
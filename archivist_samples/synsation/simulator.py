@@ -1,108 +1,165 @@
 # WARNING: Proof of concept code: Not for release
 
 # pylint:  disable=missing-docstring
-# pylint:  disable=too-many-statements
 
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import logging
+import random
+from string import Formatter
 from sys import exit as sys_exit
 from sys import stdout as sys_stdout
 import time
-import uuid
 
 from archivist import about
 from archivist.errors import ArchivistNotFoundError
+import yaml
 
 from ..testing.archivist_parser import common_parser
-from ..testing.asset import MyAsset
+from ..testing.asset import EVENTS, MyAsset
 from ..testing.parser import common_endpoint
 from ..testing.time_warp import TimeWarp
 
-from .util import attachment_upload_from_file
+from .util import attachment_upload_from_file, random_uuid
 
 LOGGER = logging.getLogger(__name__)
 
-
-def demo_flow(ac, asset_id, asset_type, tw, wait):
-    # Demo flow:
-    # -> Asset is created, nothing to see here
-    # -> White hat hacker reports vulnerability
-    # -> OEM fixes it and issues the patch
-    # -> Integrator approves the patch and issues new safety certificate
-    # -> Owner accepts new version and issues maintenance request to have
-    #    it installed by the operator
-    # -> Operator schedules downtime and patches it
-    # -> All is well
-
-    job_corval = str(uuid.uuid4())
-    cve_corval = str(uuid.uuid4())
-
-    # -> Asset is created, nothing to see here
-    # -> White hat hacker reports vulnerability
-    if wait:
-        time.sleep(wait)
-        LOGGER.info("White Hat Hacker...")
-    else:
-        input("Press to enact White Hat Hacker")
-
-    cve_id = "CVE2020-deadbeef"
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "Brian@WhiteHatHackers.io",
-    ).report_vulnerability(
-        (
-            f"Synsation Industries {asset_type}s are vulnerable "
-            f"to {cve_id}. Upgrade as soon as possible."
-        ),
-        cve_id,
-        cve_corval,
-    )
-
-    # -> OEM fixes it and issues the patch
-    if wait:
-        time.sleep(wait)
-        LOGGER.info("OEM patch...")
-    else:
-        input("Press to enact OEM issue patch")
-
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "Releases@SynsationIndustries.com",
-    ).patch_vulnerability(
-        f"Patch for critical vulnerability '{cve_id}' released in version 1.6",
-        (
-            "SHA256-sum for official 1.6 release: "
-            "68ada47318341d060c387a765dd854b57334ab1f7322d22c155428414feb7518"
-        ),
-    )
-    # -> Integrator approves the patch and issues new safety certificate
-    if wait:
-        time.sleep(wait)
-        LOGGER.info("Integrator approval...")
-    else:
-        input("Press to enact Integrator approves")
-
+CVE_ID = "CVE2020-deadbeef"
+
+# Demo flow:
+# -> Asset is created, nothing to see here
+# -> White hat hacker reports vulnerability
+# -> OEM fixes it and issues the patch
+# -> Integrator approves the patch and issues new safety certificate
+# -> Owner accepts new version and issues maintenance request to have
+#    it installed by the operator
+# -> Operator schedules downtime and patches it
+# -> All is well
+#
+# Each step is a MyAsset action recorded by who, after prompting (or
+# waiting and logging progress) unless its wait is false. Strings in args
+# and kwargs are formatted with the context of the flow: asset_type,
+# cve_id, cve_corval and job_corval, and a string that is just
+# {attachments} or {conformance_report} is replaced by that value. The
+# conformance attachments are only uploaded if a step uses them.
+DEMO_FLOW = (
+    {
+        "prompt": "Press to enact White Hat Hacker",
+        "progress": "White Hat Hacker...",
+        "who": "Brian@WhiteHatHackers.io",
+        "action": "report_vulnerability",
+        "args": [
+            (
+                "Synsation Industries {asset_type}s are vulnerable "
+                "to {cve_id}. Upgrade as soon as possible."
+            ),
+            "{cve_id}",
+            "{cve_corval}",
+        ],
+    },
+    {
+        "prompt": "Press to enact OEM issue patch",
+        "progress": "OEM patch...",
+        "who": "Releases@SynsationIndustries.com",
+        "action": "patch_vulnerability",
+        "args": [
+            "Patch for critical vulnerability '{cve_id}' released in version 1.6",
+            (
+                "SHA256-sum for official 1.6 release: "
+                "68ada47318341d060c387a765dd854b57334ab1f7322d22c155428414feb7518"
+            ),
+        ],
+    },
+    {
+        "prompt": "Press to enact Integrator approves",
+        "progress": "Integrator approval...",
+        "who": "Releases@SynsationIndustries.com",
+        "action": "certify_patch",
+        "args": [
+            (
+                "Safety conformance approved for version 1.6. "
+                "See attached conformance report"
+            ),
+            "DVA Conformance Report attached",
+            "{attachments}",
+        ],
+        "kwargs": {
+            "extra_attrs": {"synsation_conformance_report": "{conformance_report}"},
+        },
+    },
+    {
+        "prompt": "Press to enact Owner approves",
+        "progress": "Owner approval...",
+        "who": "Legal@SmartCity.fr",
+        "action": "service_required",
+        "args": ["Version 1.6 accepted. Please install ASAP", "{job_corval}"],
+    },
+    {
+        "prompt": "Press to enact Maintenance",
+        "progress": "Maintenance and patch...",
+        "who": "Phil@SynsationServicing.com",
+        "action": "service",
+        "args": [
+            "Upgraded and restarted {asset_type} during safe downtime window",
+            "{job_corval}",
+        ],
+    },
+    {
+        # the firmware is updated as part of the maintenance
+        "wait": False,
+        "who": "otaService@SynsationServicing.com",
+        "action": "update_firmware",
+        "args": [
+            "Responding to vulnerability '{cve_id}' with patch 'v1.6'",
+            "1.6",
+            "{cve_corval}",
+        ],
+    },
+)
+
+# MyAsset methods a step may call
+ACTIONS = {
+    "report_vulnerability",
+    "patch_vulnerability",
+    "certify_patch",
+    "service_required",
+    "service",
+    "update_firmware",
+    "charge",
+    "move",
+}
+
+# context values that need the conformance attachments
+ATTACHMENT_FIELDS = {"attachments", "conformance_report"}
+
+# assets whose flows are queued for each job
+FLOWS_QUEUED_PER_JOB = 2
+
+
+def load_flow(path):
+    """Load a YAML list of steps shaped like DEMO_FLOW"""
+    with open(path, mode="r", encoding="utf-8") as fd:
+        steps = yaml.safe_load(fd)
+
+    for step in steps:
+        if step.get("action") not in ACTIONS or "who" not in step:
+            raise ValueError(f"{path}: every step needs a who and an action")
+
+    return steps
+
+
+def conformance_attachments(ac):
+    """The attachments of the integrator's certificate, uploaded once per run"""
     iattachment = attachment_upload_from_file(
         ac, "trafficlightconformance.png", "image/png"
     )
     rattachment = attachment_upload_from_file(
         ac, "trafficlightconformance.pdf", "application/pdf"
     )
-
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "Releases@SynsationIndustries.com",
-    ).certify_patch(
-        "Safety conformance approved for version 1.6. See attached conformance report",
-        "DVA Conformance Report attached",
-        {
+    return {
+        "attachments": {
             "arc_primary_image": {
                 "arc_attribute_type": "arc_attachment",
                 "arc_blob_identity": iattachment["identity"],
@@ -117,58 +174,144 @@ def demo_flow(ac, asset_id, asset_type, tw, wait):
                 "arc_blob_hash_value": rattachment["hash"]["value"],
             },
         },
-        extra_attrs={"synsation_conformance_report": rattachment["identity"]},
-    )
+        "conformance_report": rattachment["identity"],
+    }
 
-    # -> Owner accepts new version and issues maintenance request to have it installed
-    if wait:
-        time.sleep(wait)
-        LOGGER.info("Owner approval...")
-    else:
-        input("Press to enact Owner approves")
-
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "Legal@SmartCity.fr",
-    ).service_required(
-        "Version 1.6 accepted. Please install ASAP",
-        job_corval,
-    )
 
-    # -> Operator schedules downtime and patches it
-    if wait:
-        time.sleep(wait)
-        LOGGER.info("Maintenance and patch...")
-    else:
-        input("Press to enact Maintenance")
-
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "Phil@SynsationServicing.com",
-    ).service(
-        f"Upgraded and restarted {asset_type} during safe downtime window",
-        job_corval,
-    )
+def fields(value):
+    """Names of the context values used by the strings in value"""
+    if isinstance(value, str):
+        return {name for _, name, _, _ in Formatter().parse(value) if name}
 
-    MyAsset(
-        ac,
-        asset_id,
-        tw,
-        "otaService@SynsationServicing.com",
-    ).update_firmware(
-        "Responding to vulnerability 'CVE2020-deadbeef' with patch 'v1.6'",
-        "1.6",
-        cve_corval,
-    )
+    if isinstance(value, dict):
+        value = list(value.values())
+
+    if isinstance(value, list):
+        return set().union(*(fields(v) for v in value))
+
+    return set()
+
+
+def fill(value, context):
+    if isinstance(value, str):
+        if value.startswith("{") and value.endswith("}") and value[1:-1] in context:
+            return context[value[1:-1]]
+
+        return value.format(**context)
+
+    if isinstance(value, dict):
+        return {k: fill(v, context) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [fill(v, context) for v in value]
+
+    return value
+
+
+def demo_flow(  # pylint: disable=too-many-arguments
+    ac, asset_id, asset_type, tw, wait, *, steps=DEMO_FLOW, interactive=True, rng=None
+):
+    # Each step waits for a key press if interactive and wait is 0.
+    # The correlation values are drawn from rng if given.
+    context = {
+        "asset_type": asset_type,
+        "cve_id": CVE_ID,
+        "cve_corval": random_uuid(rng),
+        "job_corval": random_uuid(rng),
+    }
+    if any(
+        ATTACHMENT_FIELDS & fields([step.get("args", []), step.get("kwargs", {})])
+        for step in steps
+    ):
+        context.update(conformance_attachments(ac))
+
+    emitters = {}
+    for step in steps:
+        if step.get("wait", True) and wait:
+            tw.sleep(wait)
+            if step.get("progress"):
+                LOGGER.info(step["progress"])
+        elif step.get("wait", True) and interactive and step.get("prompt"):
+            input(step["prompt"])
+
+        who = step["who"]
+        if who not in emitters:
+            emitters[who] = MyAsset(ac, asset_id, tw, who)
+
+        getattr(emitters[who], step["action"])(
+            *fill(step.get("args", []), context),
+            **fill(step.get("kwargs", {}), context),
+        )
 
     # -> All is well
     LOGGER.info("Done")
 
 
+def asset_type_of(asset):
+    return asset["attributes"].get("arc_display_type", "Device")
+
+
+def run_flows(arch, assets, tw, args, steps=DEMO_FLOW):
+    # Runs the flow for every asset, args.jobs at a time, and logs the
+    # throughput. Returns the number of flows completed.
+    # The flows run on several threads in no fixed order, so with a seed
+    # each flow draws from a generator seeded by its asset, and with
+    # virtual time each flow has a clock of its own.
+    jobs = max(args.jobs, 1)
+    started = time.monotonic()
+    events = EVENTS.total()
+    completed = failed = 0
+    window = deque()
+
+    def settle(asset, future):
+        nonlocal completed, failed
+        try:
+            future.result()
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error("Flow for %s failed: %s", asset["identity"], ex)
+            failed += 1
+        else:
+            completed += 1
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="flow") as executor:
+        for asset in assets:
+            if len(window) >= FLOWS_QUEUED_PER_JOB * jobs:
+                settle(*window.popleft())
+
+            rng = None
+            if args.seed is not None:
+                rng = random.Random(f"{args.seed}:{asset['identity']}")
+
+            future = executor.submit(
+                demo_flow,
+                arch,
+                asset["identity"],
+                asset_type_of(asset),
+                TimeWarp(tw.origin, tw.rate, virtual=True) if tw.virtual else tw,
+                args.wait,
+                steps=steps,
+                interactive=False,
+                rng=rng,
+            )
+            window.append((asset, future))
+
+        while window:
+            settle(*window.popleft())
+
+    elapsed = time.monotonic() - started
+    events = EVENTS.total() - events
+    LOGGER.info(
+        "%d flows (%d failed) with %d events in %.1fs: %.1f flows/s, %.1f events/s",
+        completed,
+        failed,
+        events,
+        elapsed,
+        completed / elapsed if elapsed else 0.0,
+        events / elapsed if elapsed else 0.0,
+    )
+    return completed
+
+
 # Main app
 ##########
 
@@ -178,6 +321,24 @@ def run(arch, args):
     LOGGER.info("Using version %s of datatrails-archivist", about.__version__)
     LOGGER.info("Fetching use case test assets namespace %s", args.namespace)
 
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    steps = load_flow(args.steps) if args.steps else DEMO_FLOW
+
+    if args.display_type or args.all_assets:
+        attrs = {"arc_display_type": args.display_type} if args.display_type else None
+        LOGGER.info("Creating time warp...")
+        tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
+
+        LOGGER.info("Beginning simulation of many assets...")
+        if not run_flows(arch, arch.assets.list(attrs=attrs), tw, args, steps):
+            LOGGER.info("No flows completed.  Aborting.")
+            sys_exit(1)
+
+        LOGGER.info("Done.")
+        sys_exit(0)
+
     LOGGER.info("Looking for asset...")
     try:
         asset = arch.assets.read_by_signature(
@@ -188,20 +349,19 @@ def run(arch, args):
         sys_exit(1)
 
     asset_id = asset["identity"]
-    attrs = asset["attributes"]
-    asset_type = attrs["arc_display_type"] if "arc_display_type" in attrs else "Device"
+    asset_type = asset_type_of(asset)
 
     LOGGER.info("Creating time warp...")
-    tw = TimeWarp(args.start_date, args.fast_forward)
+    tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
 
     LOGGER.info("Beginning simulation...")
-    demo_flow(arch, asset_id, asset_type, tw, args.wait)
+    demo_flow(arch, asset_id, asset_type, tw, args.wait, steps=steps)
 
     LOGGER.info("Done.")
     sys_exit(0)
 
 
-def entry():
+def make_parser():
     parser = common_parser("Runs the demo script manually")
     parser.add_argument(
         "--namespace",
@@ -247,7 +407,56 @@ def entry():
         default=0.0,
         help="auto-advance after WAIT seconds",
     )
+    parser.add_argument(
+        "--virtual-time",
+        dest="virtual_time",
+        action="store_true",
+        default=False,
+        help="advance the simulated time instead of waiting between events",
+    )
+    parser.add_argument(
+        "--display-type",
+        type=str,
+        dest="display_type",
+        action="store",
+        help="run the flow for every asset of this type, without prompting",
+    )
+    parser.add_argument(
+        "--all-assets",
+        dest="all_assets",
+        action="store_true",
+        default=False,
+        help="run the flow for every asset in the namespace, without prompting",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        dest="jobs",
+        action="store",
+        default=1,
+        help="run the flow for this many assets in parallel (see also --pool-size)",
+    )
+    parser.add_argument(
+        "--steps",
+        type=str,
+        dest="steps",
+        action="store",
+        help="YAML file of the steps of the flow (default: the demo flow)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        action="store",
+        help="seed the correlation values so that runs repeat",
+    )
 
+    return parser
+
+
+def entry():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("synsation", args)
@@ -1,19 +1,33 @@
 # Definitions and data for Synsation Corporation demo data
 
 # pylint: disable=missing-docstring
+# pylint: disable=too-many-arguments
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import random
-import time
 
-from ..testing.assets import make_assets_create, AttachmentDescription
+from archivist.errors import ArchivistError
+
+from ..testing.assets import (
+    make_assets_create,
+    AssetSpec,
+    AttachmentDescription,
+)
+from ..testing.json_file import load_json, save_json
+from ..testing.rate_limit import TokenBucket
 
 from .util import (
     asset_attachment_upload_from_file,
+    plan_asset_attachment_upload,
 )
 
 LOGGER = logging.getLogger(__name__)
 
+# assets created between writes of the progress file
+PROGRESS_EVERY = 100
+
 
 def attachment_create(arch, attachment_description: AttachmentDescription):
     attachment = asset_attachment_upload_from_file(
@@ -47,11 +61,9 @@ def initialise_asset_types():
     return type_map
 
 
-def create_assets(arch, asset_types, num_assets, timedelay):
-    corporation_assets = {}
-
+def asset_specs(asset_types, num_assets, rng=random):
     for i in range(num_assets):
-        displaytype = random.choice(list(asset_types))
+        displaytype = rng.choice(list(asset_types))
         safetype = displaytype.replace(" ", "").lower()
         displayname = f"synsation.assets.{safetype}_{i}"
         description = (
@@ -59,8 +71,7 @@ def create_assets(arch, asset_types, num_assets, timedelay):
             f"but this one is #{i}"
         )
 
-        newasset, _ = machines_creator(
-            arch,
+        yield AssetSpec(
             displayname,
             {
                 "arc_description": description,
@@ -72,21 +83,171 @@ def create_assets(arch, asset_types, num_assets, timedelay):
                 AttachmentDescription(asset_types[displaytype], "arc_primary_image"),
             ],
         )
-        corporation_assets[displayname] = newasset["identity"]
 
-        time.sleep(timedelay)
 
-    LOGGER.debug(corporation_assets)
+def resume_from(path, seed, num_assets):
+    """The index of the first asset not yet created according to path"""
+    progress = load_json(path, "progress file")
+    if not progress:
+        return 0
+
+    if progress.get("seed") != seed or progress.get("num_assets") != num_assets:
+        LOGGER.warning(
+            "Progress file %s is for a different fleet so starting from 0", path
+        )
+        return 0
+
+    LOGGER.info("Resuming from asset %d", progress["next"])
+    return progress["next"]
+
+
+def create_assets(
+    arch,
+    asset_types,
+    num_assets,
+    *,
+    jobs=1,
+    rate=None,
+    seed=None,
+    resume=None,
+    index=None,
+):
+    """
+    Create the assets on jobs threads at no more than rate assets per
+    second.
+
+    With a seed the same fleet is created every time. With resume, the
+    path of a JSON file, the index of the first asset not yet created is
+    kept there so that an interrupted run carries on where it stopped.
+    Returns the number of assets created or found.
+    """
+    rng = random.Random(seed) if seed is not None else random
+    start = resume_from(resume, seed, num_assets) if resume else 0
+    limiter = TokenBucket(rate) if rate else None
+
+    def create(spec):
+        if limiter is not None:
+            limiter.acquire()
+
+        newasset, _ = machines_creator(
+            arch,
+            spec.display_name,
+            spec.asset_attrs,
+            attachments=spec.attachments,
+            index=index,
+        )
+        LOGGER.debug("%s: %s", spec.display_name, newasset["identity"])
+
+    created = 0
+    failed = None
+    # all assets before this one are done
+    done = start
+    window = deque()
+
+    def finish():
+        nonlocal created, failed, done
+        position, future = window.popleft()
+        try:
+            future.result()
+        except ArchivistError as ex:
+            LOGGER.error("Asset %d could not be created: %s", position, ex)
+            if failed is None:
+                failed = position
+        else:
+            created += 1
+
+        # the assets finish in order and a failed one is retried on resume
+        done = position + 1 if failed is None else failed
+        if resume and done % PROGRESS_EVERY == 0:
+            save_progress(resume, seed, num_assets, done)
 
-    return corporation_assets
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            for position, spec in enumerate(asset_specs(asset_types, num_assets, rng)):
+                # the random choices of the skipped assets are still made so
+                # that a resumed fleet is the same as an uninterrupted one
+                if position < start:
+                    continue
 
+                # keep a few assets queued for each thread but no more
+                if len(window) >= 2 * jobs:
+                    finish()
 
-def initialise_all(ac, num_assets, timedelay):
+                window.append((position, executor.submit(create, spec)))
+
+            while window:
+                finish()
+
+    finally:
+        if resume:
+            save_progress(resume, seed, num_assets, done)
+
+    if failed is not None:
+        LOGGER.error("Not all assets could be created")
+
+    return start + created
+
+
+def save_progress(path, seed, num_assets, position):
+    save_json(path, {"seed": seed, "num_assets": num_assets, "next": position})
+
+
+def initialise_all(
+    ac, num_assets, timedelay, index=None, jobs=1, *, rate=None, seed=None, resume=None
+):
     LOGGER.info("Creating data for Synsation Corporation...")
     asset_types = initialise_asset_types()
-    assets = create_assets(ac, asset_types, num_assets, timedelay)
+
+    # a delay between assets is the same as a rate
+    if rate is None and timedelay:
+        rate = 1 / timedelay
+
+    count = create_assets(
+        ac,
+        asset_types,
+        num_assets,
+        jobs=jobs,
+        rate=rate,
+        seed=seed,
+        resume=resume,
+        index=index,
+    )
+
     LOGGER.info(
         "%d assets of %d different types created.",
-        len(assets),
+        count,
         len(asset_types),
     )
+
+
+def add_to_plan(
+    plan,
+    ac,
+    num_assets,
+    timedelay,
+    *,
+    index=None,
+    jobs=1,
+    rate=None,
+    seed=None,
+    resume=None,
+):
+    """Upload the machine images, then create the machines"""
+    uploads = [
+        plan_asset_attachment_upload(plan, ac, filename)
+        for filename in initialise_asset_types().values()
+    ]
+    plan.add(
+        "corporation",
+        initialise_all,
+        ac,
+        num_assets,
+        timedelay,
+        index=index,
+        jobs=jobs,
+        rate=rate,
+        seed=seed,
+        resume=resume,
+        after=uploads,
+        phase="create",
+    )
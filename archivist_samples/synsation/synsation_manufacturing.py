@@ -9,7 +9,7 @@ import random
 
 from ..testing.assets import make_assets_create, AttachmentDescription
 
-from .util import asset_attachment_upload_from_file
+from .util import asset_attachment_upload_from_file, plan_asset_attachment_upload
 
 
 def attachment_create(arch, attachment_description: AttachmentDescription):
@@ -76,3 +76,12 @@ def initialise_all(arch):
         asset_types["Shipping Crate"],
         "500",
     )
+
+
+def add_to_plan(plan, arch):
+    """Upload the crate image, then create the crate"""
+    uploads = [
+        plan_asset_attachment_upload(plan, arch, filename)
+        for filename in initialise_asset_types().values()
+    ]
+    plan.add("manufacturing", initialise_all, arch, after=uploads, phase="create")
@@ -0,0 +1 @@
+"""Synsation asset topologies"""
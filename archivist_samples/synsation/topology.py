@@ -0,0 +1,198 @@
+# Loads Synsation asset topologies from YAML (or JSON) specifications
+#
+# A topology is:
+#
+#   images:       display type (or image name) -> file in images/assets
+#   attributes:   attributes of every asset
+#   attachment_attributes:
+#                 extra attributes of the arc_primary_image of every asset
+#   groups:       list of groups, each with
+#     name:         name of the group, unique in the topology
+#     type:         display type of every asset in the group
+#     image:        image of every asset in the group (default: its type)
+#     attributes:   attributes of every asset in the group
+#     assets:       list of assets with name, serial, description and
+#                   optionally type, image and attributes
+#     generate:     count assets made from the name, serial and description
+#                   templates, also with optional type, image and attributes
+#
+# Names, serials and descriptions are formatted with {group}, {i} (the
+# position of the asset in its group) and {random} (a random string per
+# group).
+
+# pylint: disable=missing-docstring
+
+import importlib.resources as res
+import logging
+from os import path as os_path
+import random
+import string
+
+import yaml
+
+from ..testing.assets import (
+    make_assets_bulk_create,
+    make_assets_create,
+    AssetSpec,
+    AttachmentDescription,
+    BULK_WORKERS,
+)
+
+from . import topologies
+from .util import asset_attachment_upload_from_file, plan_asset_attachment_upload
+
+LOGGER = logging.getLogger(__name__)
+
+# assets created by each task of a plan
+TOPOLOGY_CHUNK = 500
+
+
+def attachment_create(arch, attachment_description: AttachmentDescription):
+    attachment = asset_attachment_upload_from_file(
+        arch, attachment_description.filename, "image/jpg"
+    )
+    return {
+        "arc_attribute_type": "arc_attachment",
+        "arc_blob_identity": attachment["identity"],
+        "arc_blob_hash_alg": attachment["hash"]["alg"],
+        "arc_blob_hash_value": attachment["hash"]["value"],
+        **(attachment_description.attributes or {}),
+    }
+
+
+topology_creator = make_assets_create(attachment_creator=attachment_create)
+
+
+def load_topology(source):
+    """Load the topology in the file source or, if there is no such file,
+    the packaged topology called source
+    """
+    if os_path.exists(source):
+        with open(source, mode="r", encoding="utf-8") as fd:
+            topology = yaml.safe_load(fd)
+    else:
+        resource = res.files(topologies).joinpath(f"{source}.yaml")
+        with resource.open("r", encoding="utf-8") as fd:
+            topology = yaml.safe_load(fd)
+
+    # the tasks of a plan are named after the groups
+    names = [group["name"] for group in topology.get("groups") or []]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{source}: duplicate group names {', '.join(duplicates)}")
+
+    return topology
+
+
+def group_assets(group):
+    assets = group.get("assets") or []
+    yield from assets
+
+    generate = group.get("generate")
+    if generate:
+        for _ in range(generate["count"]):
+            yield generate
+
+
+def topology_specs(topology):
+    """Yield (group name, AssetSpec) for every asset in the topology"""
+    images = topology.get("images") or {}
+    attachment_attributes = topology.get("attachment_attributes")
+    for group in topology.get("groups") or []:
+        variables = {
+            "group": group["name"],
+            "random": "".join(
+                random.choice(string.ascii_lowercase + string.digits) for _ in range(8)
+            ),
+        }
+        for i, asset in enumerate(group_assets(group)):
+            variables["i"] = i
+            displaytype = asset.get("type", group.get("type"))
+            image = asset.get("image", group.get("image", displaytype))
+            attrs = {
+                **(topology.get("attributes") or {}),
+                **(group.get("attributes") or {}),
+                **(asset.get("attributes") or {}),
+                "arc_display_type": displaytype,
+                "arc_serial_number": asset["serial"].format_map(variables),
+                "arc_description": asset["description"].format_map(variables),
+            }
+            yield group["name"], AssetSpec(
+                asset["name"].format_map(variables),
+                attrs,
+                attachments=[
+                    AttachmentDescription(
+                        images[image], "arc_primary_image", attachment_attributes
+                    ),
+                ],
+            )
+
+
+def create_topology(arch, topology, index=None):
+    """Create the assets of the topology one after another"""
+    created = 0
+    for _, spec in topology_specs(topology):
+        newasset, _ = topology_creator(
+            arch,
+            spec.display_name,
+            spec.asset_attrs,
+            attachments=spec.attachments,
+            index=index,
+        )
+        LOGGER.debug(newasset)
+        created += 1
+
+    return created
+
+
+def create_specs(arch, specs, index=None, jobs=BULK_WORKERS):
+    results = make_assets_bulk_create(
+        attachment_creator=attachment_create, max_workers=jobs
+    )(arch, specs, index=index)
+    failed = [result for result in results if result.error is not None]
+    if failed:
+        raise failed[0].error
+
+    return len(results)
+
+
+def add_topology_to_plan(
+    plan, arch, topology, label, *, index=None, jobs=1, chunk=TOPOLOGY_CHUNK
+):
+    """
+    Upload each distinct image once, then create the assets of each group
+    in tasks of up to chunk assets, each using jobs threads
+    """
+
+    def add_chunk(group_name, specs, number):
+        # each distinct image is uploaded by one task
+        uploads = {
+            plan_asset_attachment_upload(plan, arch, attachment.filename)
+            for spec in specs
+            for attachment in spec.attachments
+        }
+        plan.add(
+            f"{label} {group_name} {number}",
+            create_specs,
+            arch,
+            specs,
+            index=index,
+            jobs=jobs,
+            after=sorted(uploads),
+            phase="create",
+        )
+
+    specs = []
+    current = None
+    number = 0
+    for group_name, spec in topology_specs(topology):
+        if specs and (group_name != current or len(specs) >= chunk):
+            add_chunk(current, specs, number)
+            specs = []
+            number = number + 1 if group_name == current else 0
+
+        current = group_name
+        specs.append(spec)
+
+    if specs:
+        add_chunk(current, specs, number)
@@ -3,21 +3,39 @@
 
 # pylint:  disable=missing-docstring
 
-import importlib.resources as res
+import random
+import uuid
+
+from ..testing.uploads import upload_from_package
 
 from . import images
 from .images import assets as images_assets
 
 
 def asset_attachment_upload_from_file(arch, name, mtype):
-    with res.files(images_assets).joinpath(name).open("rb") as fd:
-        attachment = arch.attachments.upload(fd, mtype=mtype)
+    return upload_from_package(arch, images_assets, name, mtype=mtype)
+
 
-    return attachment
+def plan_asset_attachment_upload(plan, arch, name, mtype="image/jpg"):
+    """Add the upload of an asset image to plan, once, and return the task"""
+    task = f"upload {name}"
+    if task not in plan.tasks:
+        plan.add(
+            task,
+            asset_attachment_upload_from_file,
+            arch,
+            name,
+            mtype,
+            phase="upload",
+        )
+
+    return task
 
 
 def attachment_upload_from_file(arch, name, mtype):
-    with res.files(images).joinpath(name).open("rb") as fd:
-        attachment = arch.attachments.upload(fd, mtype=mtype)
+    return upload_from_package(arch, images, name, mtype=mtype)
+
 
-    return attachment
+def random_uuid(rng=None):
+    """uuid4 drawn from rng, or the random module, so that seeded runs repeat"""
+    return str(uuid.UUID(int=(rng or random).getrandbits(128), version=4))
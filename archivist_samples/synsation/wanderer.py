@@ -4,69 +4,341 @@
 # pylint: disable=missing-docstring
 # pylint: disable=logging-fstring-interpolation
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+from itertools import islice
 import logging
+import random
 from sys import exit as sys_exit
 from sys import stdout as sys_stdout
+from threading import Lock
 import time
 
 from archivist import about
 from archivist.errors import ArchivistNotFoundError
+import yaml
 
 from ..testing.archivist_parser import common_parser
 from ..testing.asset import MyAsset
+from ..testing.async_asset import AsyncEmitter, AsyncMyAsset
+from ..testing.event_batcher import EventBatcher
 from ..testing.parser import common_endpoint
-from ..testing.time_warp import TimeWarp
+from ..testing.time_warp import Scheduler, TimeWarp
 
 LOGGER = logging.getLogger(__name__)
 
+CRATE_TYPE = "Widget shipping crate"
+
+# who moves the crates
+SMART_TAG = "1944.smarttags.synsation.io"
+
+# A journey from Manufacturing home to regional plant
+# Flint -> Chicago -> Newark Liberty -> Heathrow T4 -> Munich -> Stuttgart -> plant
+START = ["Synsation Flint Manufacturing", "43.018889", "-83.693333"]
+WAYPOINTS = [
+    ["Chicago Freight Hub", "41.978611", "-87.904722"],
+    ["Newark Freight Intl", "40.692500", "-74.168611"],
+    ["London Heathrow T4", "51.459455", "-0.446953"],
+    ["Munich Forwarding", "48.353889", "11.786111"],
+    ["Stuttgart Hub", "48.690000", "9.221944"],
+]
+END = ["Synsation Stuttgart Finishing Plant", "48.783333", "9.183333"]
+ROUTE = [START, *WAYPOINTS, END]
+
+# threads moving the crates when many are shipped at once
+WORKERS = 8
+
+# crates found before the next ones are looked for
+DISCOVER_BATCH = 100
+
 
 # Archivist utilities
 #####################
 
 
-def shipit(ac, crate_id, delay, tw):
-    # Simulate a journey from Manufacturing home to regional plant
-    # Flint -> Chicago -> Newark Liberty -> Heathrow T4 -> Munich -> Stuttgart -> plant
-    start = ["Synsation Flint Manufacturing", "43.018889", "-83.693333"]
-    waypoints = [
-        ["Chicago Freight Hub", "41.978611", "-87.904722"],
-        ["Newark Freight Intl", "40.692500", "-74.168611"],
-        ["London Heathrow T4", "51.459455", "-0.446953"],
-        ["Munich Forwarding", "48.353889", "11.786111"],
-        ["Stuttgart Hub", "48.690000", "9.221944"],
-    ]
-    end = ["Synsation Stuttgart Finishing Plant", "48.783333", "9.183333"]
+def random_route():
+    """From START to END through some of the WAYPOINTS, in order"""
+    stops = random.sample(range(len(WAYPOINTS)), random.randint(1, len(WAYPOINTS)))
+    return [START, *(WAYPOINTS[i] for i in sorted(stops)), END]
+
+
+def load_routes(path):
+    """Load a YAML list of routes, each a list of [name, latitude, longitude]"""
+    with open(path, mode="r", encoding="utf-8") as fd:
+        routes = yaml.safe_load(fd)
+
+    for route in routes:
+        if len(route) < 2 or any(len(stop) != 3 for stop in route):
+            raise ValueError(f"{path}: a route needs 2 or more [name, lat, lng]")
+
+    return [[[str(value) for value in stop] for stop in route] for route in routes]
+
+
+def moves(route):
+    """(description, latitude, longitude) of each move along route"""
+    first, *middle, last = route
+    yield f"Crate sealed in {first[0]} with 448 units on board", first[1], first[2]
+    for point in middle:
+        yield (
+            f"Crate transferred by shipping agent at {point[0]} for onward forwarding",
+            point[1],
+            point[2],
+        )
+
+    yield f"Crate unsealed in {last[0]} with 448 units on board", last[1], last[2]
+
+
+def shipit(ac, crate_id, delay, tw, batcher=None, *, route=None):
+    route = route or ROUTE
 
     # who moves it and type of movement
     asset = MyAsset(
         ac,
         crate_id,
         tw,
-        "1944.smarttags.synsation.io",
+        SMART_TAG,
+        batcher=batcher,
     )
-    asset.move(
-        f"Crate sealed in {start[0]} with 448 units on board",
-        start[1],
-        start[2],
+    last = len(route) - 1
+    for i, (point, move) in enumerate(zip(route, moves(route))):
+        if i == last:
+            LOGGER.info(f"Asset ending its journey at {point[0]}")
+        elif i:
+            LOGGER.info(f"Asset arriving at {point[0]}")
+
+        asset.move(*move)
+        if i < last:
+            tw.sleep(delay)
+
+
+class Journeys:  # pylint: disable=too-many-instance-attributes
+    """Moves many crates along their routes with one Scheduler
+
+    Every move is an entry in the deadline heap of the scheduler, so all
+    the crates share its worker pool or, with virtual time, its one
+    thread. The scheduler is stopped once every crate found has finished
+    its journey.
+    """
+
+    def __init__(self, scheduler, delay):
+        self._scheduler = scheduler
+        self._delay = delay
+        self._lock = Lock()
+        self._travelling = 0
+        self._found_all = False
+        self.crates = 0
+        self.moved = 0
+        self.failed = 0
+
+    def start(self, asset, route, after=0.0):
+        """Start moving asset along route after some seconds"""
+        with self._lock:
+            self.crates += 1
+            self._travelling += 1
+
+        self._scheduler.schedule_after(after, self._move, asset, list(moves(route)))
+
+    def found_all(self):
+        """No more crates will be started"""
+        with self._lock:
+            self._found_all = True
+            finished = not self._travelling
+
+        if finished:
+            self._scheduler.stop()
+
+    def _move(self, asset, remaining):
+        try:
+            asset.move(*remaining[0])
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error("Crate %s lost in transit: %s", asset.crate_id, ex)
+            with self._lock:
+                self.failed += 1
+
+            self._arrived()
+            return
+
+        with self._lock:
+            self.moved += 1
+
+        if len(remaining) > 1:
+            self._scheduler.schedule_after(
+                self._delay, self._move, asset, remaining[1:]
+            )
+        else:
+            self._arrived()
+
+    def _arrived(self):
+        with self._lock:
+            self._travelling -= 1
+            finished = self._found_all and not self._travelling
+
+        if finished:
+            self._scheduler.stop()
+
+
+def ship_fleet(arch, args, tw, batcher=None):
+    # Every crate (or the first args.crates) sets off along a random route,
+    # or one of the routes in args.routes, as soon as it is found. The
+    # departures are spread over the first args.wait seconds.
+    # The crates are found DISCOVER_BATCH at a time by the scheduler. With
+    # virtual time the next batch is only found once the crates of the last
+    # one have set off, so the heap holds the crates on the move rather than
+    # every crate there is.
+    routes = load_routes(args.routes) if args.routes else None
+    executor = None
+    if not tw.virtual:
+        executor = ThreadPoolExecutor(
+            max_workers=args.workers, thread_name_prefix="wanderer"
+        )
+
+    scheduler = Scheduler(
+        tw, executor=executor, max_pending=args.workers if executor else None
     )
-    time.sleep(delay)
+    journeys = Journeys(scheduler, args.wait)
+    crates = None
 
-    for point in waypoints:
-        LOGGER.info(f"Asset arriving at {point[0]}")
-        asset.move(
-            f"Crate transferred by shipping agent at {point[0]} for onward forwarding",
-            point[1],
-            point[2],
+    def discover():
+        nonlocal crates
+        found = 0
+        last = 0.0
+        more = False
+        try:
+            if crates is None:
+                crates = islice(
+                    arch.assets.list(attrs={"arc_display_type": CRATE_TYPE}),
+                    args.crates or None,
+                )
+
+            for crate in islice(crates, DISCOVER_BATCH):
+                found += 1
+                asset = MyAsset(arch, crate["identity"], tw, SMART_TAG, batcher=batcher)
+                route = random.choice(routes) if routes else random_route()
+                after = random.uniform(0, args.wait)
+                last = max(last, after)
+                journeys.start(asset, route, after=after)
+
+            more = found == DISCOVER_BATCH
+
+        finally:
+            # the scheduler must stop even if the crates cannot be listed
+            if more:
+                scheduler.schedule_after(last if tw.virtual else 0, discover)
+            else:
+                journeys.found_all()
+
+    started = time.monotonic()
+    scheduler.schedule_after(0, discover)
+
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        LOGGER.info("Journeys stopped at %s", tw.now())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.monotonic() - started
+    LOGGER.info(
+        "%d crates made %d moves in %.1fs (%.1f/s), %d lost in transit",
+        journeys.crates,
+        journeys.moved,
+        elapsed,
+        journeys.moved / elapsed if elapsed else 0.0,
+        journeys.failed,
+    )
+    return journeys.crates
+
+
+async def ship_fleet_async(arch, args, tw):
+    # Like ship_fleet but every crate is a coroutine on one event loop and
+    # the moves are made by an AsyncEmitter with args.workers threads.
+    # Returns the number of crates shipped.
+    routes = load_routes(args.routes) if args.routes else None
+    loop = asyncio.get_running_loop()
+    counts = {"moved": 0, "failed": 0}
+
+    async def journey(asset, route, after):
+        await asyncio.sleep(after)
+        try:
+            for i, move in enumerate(moves(route)):
+                if i:
+                    await asyncio.sleep(args.wait)
+
+                await asset.move(*move)
+                counts["moved"] += 1
+
+        except Exception as ex:  # pylint: disable=broad-except
+            LOGGER.error("Crate %s lost in transit: %s", asset.crate_id, ex)
+            counts["failed"] += 1
+
+    started = time.monotonic()
+    journeys = []
+    async with AsyncEmitter(arch, max_concurrency=args.workers) as emitter:
+        crates = islice(
+            arch.assets.list(attrs={"arc_display_type": CRATE_TYPE}),
+            args.crates or None,
         )
-        time.sleep(delay)
+        while True:
+            # the pages of crates are fetched without blocking the journeys
+            batch = await loop.run_in_executor(
+                None, lambda: list(islice(crates, DISCOVER_BATCH))
+            )
+            for crate in batch:
+                asset = AsyncMyAsset(
+                    arch, crate["identity"], tw, SMART_TAG, emitter=emitter
+                )
+                route = random.choice(routes) if routes else random_route()
+                journeys.append(
+                    asyncio.create_task(
+                        journey(asset, route, random.uniform(0, args.wait))
+                    )
+                )
+
+            if len(batch) < DISCOVER_BATCH:
+                break
+
+        await asyncio.gather(*journeys)
 
-    LOGGER.info(f"Asset ending its journey at {end[0]}")
-    asset.move(
-        f"Crate unsealed in {end[0]} with 448 units on board",
-        end[1],
-        end[2],
+    elapsed = time.monotonic() - started
+    LOGGER.info(
+        "%d crates made %d moves in %.1fs (%.1f/s), %d lost in transit",
+        len(journeys),
+        counts["moved"],
+        elapsed,
+        counts["moved"] / elapsed if elapsed else 0.0,
+        counts["failed"],
     )
+    return len(journeys)
+
+
+def run_fleet(arch, args):
+    LOGGER.info("Creating time warp...")
+    tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
+
+    LOGGER.info("Beginning journey simulation of many crates...")
+    if args.async_events:
+        if args.virtual_time or args.batch_size:
+            LOGGER.info("--async cannot be used with virtual time or batches")
+            sys_exit(1)
+
+        shipped = asyncio.run(ship_fleet_async(arch, args, tw))
+    else:
+        batcher = None
+        if args.batch_size:
+            batcher = EventBatcher(arch, batch_size=args.batch_size)
+
+        shipped = ship_fleet(arch, args, tw, batcher=batcher)
+        if batcher is not None:
+            batcher.close()
+
+    if not shipped:
+        LOGGER.info("Could not find any crates.  Aborting.")
+        sys_exit(1)
+
+    LOGGER.info("Done.")
+    sys_exit(0)
 
 
 def run(arch, args):
@@ -74,6 +346,12 @@ def run(arch, args):
     LOGGER.info("Using version %s of datatrails-archivist", about.__version__)
     LOGGER.info("Fetching use case test assets namespace %s", args.namespace)
 
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.crates is not None:
+        run_fleet(arch, args)
+
     # Find the asset record
     crate_id = None
     if args.asset_name:
@@ -88,30 +366,32 @@ def run(arch, args):
             crate_id = crate["identity"]
     else:
         LOGGER.info("No crate specified...searching for one...")
-        crates = list(
-            arch.assets.list(
-                attrs={"arc_display_type": "Widget shipping crate"},
-            )
+        crate = next(
+            iter(arch.assets.list(attrs={"arc_display_type": CRATE_TYPE})), None
         )
-        if len(crates) > 0:
-            LOGGER.info(f"Using '{crates[0]['attributes']['arc_display_name']}'")
-            crate_id = crates[0]["identity"]
+        if crate is not None:
+            LOGGER.info(f"Using '{crate['attributes']['arc_display_name']}'")
+            crate_id = crate["identity"]
 
     if not crate_id:
         LOGGER.info("Could not find target crate.  Aborting.")
         sys_exit(1)
 
     LOGGER.info("Creating time warp...")
-    tw = TimeWarp(args.start_date, args.fast_forward)
+    tw = TimeWarp(args.start_date, args.fast_forward, virtual=args.virtual_time)
 
     LOGGER.info("Beginning journey simulation...")
-    shipit(arch, crate_id, args.wait, tw)
+    if args.batch_size:
+        with EventBatcher(arch, batch_size=args.batch_size) as batcher:
+            shipit(arch, crate_id, args.wait, tw, batcher=batcher)
+    else:
+        shipit(arch, crate_id, args.wait, tw)
 
     LOGGER.info("Done.")
     sys_exit(0)
 
 
-def entry():
+def make_parser():
     parser = common_parser(
         "Populates an Archivist install with devices from an Azure IoT Hub"
     )
@@ -159,7 +439,66 @@ def entry():
         default=3600,
         help="Fast forward time in event series (default: 1 second = 1 hour)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        dest="batch_size",
+        action="store",
+        default=0,
+        help="create events in batches of this size (default: no batching)",
+    )
+    parser.add_argument(
+        "--virtual-time",
+        dest="virtual_time",
+        action="store_true",
+        default=False,
+        help="advance the simulated time instead of waiting between events",
+    )
+    parser.add_argument(
+        "--crates",
+        type=int,
+        dest="crates",
+        action="store",
+        help="ship this many crates at once (0: every crate)",
+    )
+    parser.add_argument(
+        "--routes",
+        type=str,
+        dest="routes",
+        action="store",
+        help=(
+            "YAML file of routes, each a list of [name, latitude, longitude], "
+            "for the crates to choose from (default: random routes)"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        dest="workers",
+        action="store",
+        default=WORKERS,
+        help="threads moving the crates when shipping many",
+    )
+    parser.add_argument(
+        "--async",
+        dest="async_events",
+        action="store_true",
+        default=False,
+        help="move the crates from coroutines on one event loop (with --crates)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        dest="seed",
+        action="store",
+        help="seed the routes so that runs with virtual time repeat",
+    )
 
+    return parser
+
+
+def entry():
+    parser = make_parser()
     args = parser.parse_args()
 
     arch = common_endpoint("synsation", args)
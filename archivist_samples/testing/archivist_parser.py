@@ -15,7 +15,15 @@ from sys import exit as sys_exit
 
 from archivist.logger import set_logger
 
-from ..archivist import Archivist
+from ..archivist import (
+    Archivist,
+    pooled_session,
+    BACKOFF,
+    MAX_RETRIES,
+    POOL_SIZE,
+)
+from .event_template import ENCODING
+from .uploads import upload_cache
 
 LOGGER = logging.getLogger(__name__)
 
@@ -91,6 +99,65 @@ def common_parser(description):
         default="",
         help="partner id",
     )
+    parser.add_argument(
+        "--upload-cache",
+        type=str,
+        dest="upload_cache",
+        action="store",
+        help="FILE remembering uploaded attachments so later runs can reuse them",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        dest="pool_size",
+        action="store",
+        default=POOL_SIZE,
+        help="maximum number of connections kept open to DataTrails",
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        dest="keep_alive",
+        action="store_false",
+        default=True,
+        help="close the connection after every request",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        dest="max_retries",
+        action="store",
+        default=MAX_RETRIES,
+        help="retry failed connections and 502/503/504 responses this many times",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        dest="backoff",
+        action="store",
+        default=BACKOFF,
+        help="backoff factor in seconds between retries",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        dest="timeout",
+        action="store",
+        help="seconds to wait for DataTrails to respond (default: wait forever)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        dest="rate",
+        action="store",
+        help="maximum requests per second to DataTrails (default: no limit)",
+    )
+    parser.add_argument(
+        "--profile-encoding",
+        dest="profile_encoding",
+        action="store_true",
+        default=False,
+        help="log how long encoding the events took, by type of event",
+    )
 
     return parser
 
@@ -108,15 +175,31 @@ def endpoint(args):
         with open(args.auth_token_file, mode="r", encoding="utf-8") as tokenfile:
             authtoken = tokenfile.read().strip()
 
+        # all copies of arch share this session and so its connections
+        session = pooled_session(
+            pool_size=args.pool_size,
+            max_retries=args.max_retries,
+            backoff=args.backoff,
+            timeout=args.timeout,
+            keep_alive=args.keep_alive,
+            rate=args.rate,
+        )
         arch = Archivist(
             args.url,
             authtoken,
             partner_id=args.partner_id,
+            session=session,
         )
 
     if arch is None:
         LOGGER.error("Critical error.  Aborting.")
         sys_exit(1)
 
+    if args.upload_cache:
+        upload_cache.load(args.upload_cache)
+
+    if args.profile_encoding:
+        ENCODING.enable()
+
     LOGGER.info("User agent is %s", arch.user_agent)
     return arch
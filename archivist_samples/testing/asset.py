@@ -6,8 +6,15 @@ and this code may be added to the python SDK at some later date...
 
 # pylint:  disable=missing-docstring
 
+from copy import deepcopy
+import json
+from threading import Lock
+from time import perf_counter_ns
+
 from archivist.timestamp import make_timestamp
 
+from .event_template import ENCODING, EventTemplate, hole, post_event
+
 CONFIG_MANAGEMENT = "Config Management"
 OPERATIONAL_REPORT = "Operational Report"
 MAINTENANCE_PERFORMED = "Maintenance Performed"
@@ -17,11 +24,112 @@ VULNERABILITY_ADDRESSED = "Vulnerability Addressed"
 VULNERABILITY_REPORT = "Vulnerability Report"
 
 
+class EventTally:
+    """Counts the events created or queued by all the assets of a process"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._total = 0
+
+    def add(self, count=1):
+        with self._lock:
+            self._total += count
+
+    def total(self):
+        with self._lock:
+            return self._total
+
+
+EVENTS = EventTally()
+
+
+PROPS = {
+    "behaviour": "RecordEvidence",
+    "operation": "Record",
+    "principal_declared": {
+        "issuer": "job.idp.server/1234",
+        "subject": hole("who"),
+        "display_name": hole("who"),
+    },
+    "timestamp_declared": hole("timestamp"),
+}
+
+CHARGE = EventTemplate(
+    "charge",
+    PROPS,
+    {
+        "arc_display_type": OPERATIONAL_REPORT,
+        "arc_description": hole("desc"),
+        "arc_evidence": hole("evidence"),
+    },
+)
+MOVE = EventTemplate(
+    "move",
+    PROPS,
+    {
+        "arc_display_type": SHIPPING_MOVEMENT,
+        "arc_description": hole("desc"),
+        "arc_gis_lat": hole("lat"),
+        "arc_gis_lng": hole("lng"),
+    },
+)
+PATCH_VULNERABILITY = EventTemplate(
+    "patch_vulnerability",
+    PROPS,
+    {
+        "arc_display_type": CONFIG_MANAGEMENT,
+        "arc_description": hole("desc"),
+        "arc_evidence": hole("evidence"),
+    },
+)
+REPORT_VULNERABILITY = EventTemplate(
+    "report_vulnerability",
+    PROPS,
+    {
+        "arc_display_type": VULNERABILITY_REPORT,
+        "arc_description": hole("desc"),
+        "arc_cve_id": hole("cve_id"),
+        "arc_correlation_value": hole("corval"),
+    },
+)
+SERVICE_REQUIRED = EventTemplate(
+    "service_required",
+    PROPS,
+    {
+        "arc_display_type": MAINTENANCE_REQUEST,
+        "arc_description": hole("desc"),
+        "arc_correlation_value": hole("corval"),
+    },
+)
+SERVICE = EventTemplate(
+    "service",
+    PROPS,
+    {
+        "arc_display_type": MAINTENANCE_PERFORMED,
+        "arc_description": hole("desc"),
+        "arc_correlation_value": hole("corval"),
+    },
+)
+UPDATE_FIRMWARE = EventTemplate(
+    "update_firmware",
+    PROPS,
+    {
+        "arc_display_type": VULNERABILITY_ADDRESSED,
+        "arc_description": hole("desc"),
+        "arc_firmware_version": hole("fw_version"),
+        "arc_correlation_value": hole("corval"),
+    },
+    asset_attrs={"arc_firmware_version": hole("fw_version")},
+)
+
+
 class MyAsset:
-    def __init__(self, ac, crate_id, tw, who):
+    def __init__(self, ac, crate_id, tw, who, *, batcher=None):
         self.ac = ac
         self.crate_id = crate_id
         self.tw = tw
+        self.who = who
+        self.batcher = batcher
         self.base_props = {
             "behaviour": "RecordEvidence",
             "operation": "Record",
@@ -31,23 +139,67 @@ class MyAsset:
                 "display_name": who,
             },
         }
+        # event fixtures have to be merged into each event by the SDK
+        self.precompiled = not ac.fixtures.get("events")
+
+    def _props(self):
+        """Event properties timestamped with the warped time of the call"""
+        return {
+            **self.base_props,
+            "timestamp_declared": make_timestamp(self.tw.now()),
+        }
+
+    def _create(self, attrs, *, asset_attrs=None):
+        """Create the event now or, if batching, queue it and return a Future"""
+        props = self._props()
+        EVENTS.add()
+        if self.batcher is not None:
+            return self.batcher.submit(
+                self.crate_id, props, attrs, asset_attrs=asset_attrs
+            )
+
+        return self.ac.events.create(
+            self.crate_id, props, attrs, asset_attrs=asset_attrs
+        )
+
+    def _create_from(self, template, **values):
+        """Create the event from template with its holes filled from values"""
+        if not self.precompiled:
+            attrs, asset_attrs = template.attributes(values)
+            return self._create(attrs, asset_attrs=asset_attrs)
+
+        values["who"] = self.who
+        values["timestamp"] = make_timestamp(self.tw.now())
+        body = template.render(values)
+        if ENCODING.enabled:
+            self._profile(template, values)
+
+        return self._create_body(body)
+
+    @staticmethod
+    def _profile(template, values):
+        """Time both encodings of the same event under the template's name"""
+        start = perf_counter_ns()
+        template.render(values)
+        ENCODING.add(template.name, "template", perf_counter_ns() - start)
+
+        event = template.event(values)
+        # roughly what the SDK does with the dicts
+        start = perf_counter_ns()
+        json.dumps(deepcopy(event)).encode()
+        ENCODING.add(template.name, "dict", perf_counter_ns() - start)
+
+    def _create_body(self, body):
+        """Create the event from its JSON body, or queue it if batching"""
+        EVENTS.add()
+        if self.batcher is not None:
+            return self.batcher.submit_body(self.crate_id, body)
+
+        return post_event(self.ac, self.crate_id, body)
 
     def charge(self, desc, evidence):
         """Charge device"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": OPERATIONAL_REPORT,
-                "arc_description": desc,
-                "arc_evidence": evidence,
-            },
-        )
+        return self._create_from(CHARGE, desc=desc, evidence=evidence)
 
     def certify_patch(self, desc, evidence, attachments, extra_attrs=None):
         """Certify issued patch"""
@@ -62,119 +214,32 @@ class MyAsset:
         if extra_attrs is not None:
             attrs.update(extra_attrs)
 
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            attrs,
-        )
+        return self._create(attrs)
 
     def move(self, desc, lat, lng):
         """Move asset from one place to another"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": SHIPPING_MOVEMENT,
-                "arc_description": desc,
-                "arc_gis_lat": lat,
-                "arc_gis_lng": lng,
-            },
-        )
+        return self._create_from(MOVE, desc=desc, lat=lat, lng=lng)
 
     def patch_vulnerability(self, desc, evidence):
         """Patch  vulnerability"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": CONFIG_MANAGEMENT,
-                "arc_description": desc,
-                "arc_evidence": evidence,
-            },
-        )
+        return self._create_from(PATCH_VULNERABILITY, desc=desc, evidence=evidence)
 
     def report_vulnerability(self, desc, cve_id, cve_corval):
         """Report vulnerability"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": VULNERABILITY_REPORT,
-                "arc_description": desc,
-                "arc_cve_id": cve_id,
-                "arc_correlation_value": cve_corval,
-            },
+        return self._create_from(
+            REPORT_VULNERABILITY, desc=desc, cve_id=cve_id, corval=cve_corval
         )
 
     def service_required(self, desc, corval):
         """Indicate that maintenance must been done"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": MAINTENANCE_REQUEST,
-                "arc_description": desc,
-                "arc_correlation_value": corval,
-            },
-        )
+        return self._create_from(SERVICE_REQUIRED, desc=desc, corval=corval)
 
     def service(self, desc, corval):
         """Indicate that maintenance has been done"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": MAINTENANCE_PERFORMED,
-                "arc_description": desc,
-                "arc_correlation_value": corval,
-            },
-        )
+        return self._create_from(SERVICE, desc=desc, corval=corval)
 
     def update_firmware(self, desc, fw_version, corval):
         """Update firmware"""
-        self.ac.events.create(
-            self.crate_id,
-            {
-                **self.base_props,
-                **{
-                    "timestamp_declared": make_timestamp(self.tw.now()),
-                },
-            },
-            {
-                "arc_display_type": VULNERABILITY_ADDRESSED,
-                "arc_description": desc,
-                "arc_firmware_version": fw_version,
-                "arc_correlation_value": corval,
-            },
-            asset_attrs={"arc_firmware_version": fw_version},
+        return self._create_from(
+            UPDATE_FIRMWARE, desc=desc, fw_version=fw_version, corval=corval
         )
@@ -2,30 +2,167 @@
 
 # pylint:  disable=missing-docstring
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import logging
-from typing import Callable, Dict, List, Optional
+from threading import RLock
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
 from archivist import archivist as type_helper
 
 from archivist.errors import ArchivistNotFoundError
 
 LOGGER = logging.getLogger(__name__)
 
+INDEX_TTL = 300.0
+INDEX_MAX_SIZE = 10000
+BULK_WORKERS = 8
+
 
 @dataclass
 class AttachmentDescription:
     filename: str
     attribute_name: str
+    # extra attributes of the attachment attribute itself
+    attributes: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class AssetSpec:
+    display_name: str
+    asset_attrs: Dict[str, Any]
+    attachments: Optional[List[AttachmentDescription]] = None
+    selector_key: str = "arc_display_name"
+    selector_value: Optional[str] = None
+
+
+@dataclass
+class BulkResult:
+    spec: AssetSpec
+    asset: Optional[Dict[str, Any]] = None
+    existed: bool = False
+    error: Optional[Exception] = None
+
+
+class AssetIndex:
+    """
+    Local index of existing assets that replaces the read_by_signature round
+    trip made before every create.
+
+    The first lookup for a display type lists all assets of that type, page by
+    page, and indexes them by each of the attribute keys. The namespace
+    fixture of the Archivist instance is applied to the list so use one index
+    per Archivist instance.
+
+    While the list is younger than ttl seconds a miss is authoritative and
+    no request is made. Once more than max_size values are indexed the least
+    recently used are evicted and, as the index is then incomplete, misses
+    fall back to the server. Values that match more than one asset always
+    fall back to the server so that the usual ArchivistDuplicateError is
+    raised. Selector values are assumed not to be shared by assets of other
+    display types.
+    """
+
+    def __init__(
+        self,
+        *,
+        keys=("arc_display_name",),
+        ttl=INDEX_TTL,
+        max_size=INDEX_MAX_SIZE,
+        page_size=None,
+    ):
+        self._keys = tuple(keys)
+        self._ttl = ttl
+        self._max_size = max_size
+        self._page_size = page_size
+        self._lock = RLock()
+        self._entries = OrderedDict()  # (key, value) -> {identity: asset}
+        # display type -> [monotonic time of the list, authoritative]
+        self._warmed = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, asset):
+        """Index an asset e.g. one that was just created"""
+        attrs = asset.get("attributes", {})
+        with self._lock:
+            for key in self._keys:
+                value = attrs.get(key)
+                if value is None:
+                    continue
+
+                entry = self._entries.setdefault((key, value), {})
+                entry[asset["identity"]] = asset
+                self._entries.move_to_end((key, value))
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                for warmed in self._warmed.values():
+                    warmed[1] = False
+
+    def warm(self, arch, display_type):
+        """List all assets of display type and index them"""
+        with self._lock:
+            LOGGER.debug("Indexing assets of type %s", display_type)
+            warmed = [monotonic(), True]
+            self._warmed[display_type] = warmed
+            for asset in arch.assets.list(
+                page_size=self._page_size,
+                attrs={"arc_display_type": display_type},
+            ):
+                self.add(asset)
+
+            if not warmed[1]:
+                LOGGER.info(
+                    "More than %d assets indexed, lookups may need requests",
+                    self._max_size,
+                )
+
+    def read_by_signature(self, arch, attrs, *, display_type=None):
+        """Same as arch.assets.read_by_signature but resolved locally if possible"""
+        if display_type is None or len(attrs) != 1:
+            return arch.assets.read_by_signature(attrs=attrs)
+
+        ((key, value),) = attrs.items()
+        if key not in self._keys:
+            return arch.assets.read_by_signature(attrs=attrs)
+
+        with self._lock:
+            warmed = self._warmed.get(display_type)
+            if warmed is None or monotonic() - warmed[0] > self._ttl:
+                self.warm(arch, display_type)
+
+            matches = self._entries.get((key, value))
+            if matches is not None:
+                self._entries.move_to_end((key, value))
+                matches = list(matches.values())
+
+            authoritative = self._warmed[display_type][1]
 
+        if matches and len(matches) == 1:
+            return matches[0]
 
-def assets_create_if_not_exists(arch, attrs):
+        if not matches and authoritative:
+            raise ArchivistNotFoundError(f"{key} {value} not found in index")
+
+        return arch.assets.read_by_signature(attrs=attrs)
+
+
+def assets_create_if_not_exists(arch, attrs, *, index=None):
     asset = None
+    selector = {
+        "arc_display_name": attrs["arc_display_name"],
+    }
     try:
-        asset = arch.assets.read_by_signature(
-            attrs={
-                "arc_display_name": attrs["arc_display_name"],
-            },
-        )
+        if index is not None:
+            asset = index.read_by_signature(
+                arch, selector, display_type=attrs.get("arc_display_type")
+            )
+        else:
+            asset = arch.assets.read_by_signature(attrs=selector)
     except ArchivistNotFoundError:
         # The backoff module we use seems to inherit the exception
         # raised here so we execute the assets_create outside of this
@@ -35,7 +172,11 @@ def assets_create_if_not_exists(arch, attrs):
     else:
         return asset
 
-    return arch.assets.create(attrs=attrs)
+    asset = arch.assets.create(attrs=attrs)
+    if index is not None:
+        index.add(asset)
+
+    return asset
 
 
 def make_assets_create(
@@ -52,6 +193,9 @@ def make_assets_create(
     But passing in `selector_key` and `selector_value` to the returned
     function allows for a custom selector.
 
+    Passing an AssetIndex as `index` resolves the selector locally instead of
+    with a read_by_signature request per asset.
+
     the argument is the method that creates an attachment of the form
          attachment_create(arch, ("filename", "display_name"))
     """
@@ -63,7 +207,8 @@ def make_assets_create(
         *,
         attachments: Optional[List[AttachmentDescription]] = None,
         selector_key="arc_display_name",
-        selector_value=None
+        selector_value=None,
+        index: Optional[AssetIndex] = None,
     ):
         asset = None
         existed = False
@@ -72,12 +217,16 @@ def make_assets_create(
         if selector_value is None:
             selector_value = display_name
 
+        selector = {
+            selector_key: selector_value,
+        }
         try:
-            asset = arch.assets.read_by_signature(
-                attrs={
-                    selector_key: selector_value,
-                },
-            )
+            if index is not None:
+                asset = index.read_by_signature(
+                    arch, selector, display_type=asset_attrs.get("arc_display_type")
+                )
+            else:
+                asset = arch.assets.read_by_signature(attrs=selector)
 
         except ArchivistNotFoundError:
             asset_attrs["arc_display_name"] = display_name
@@ -92,6 +241,8 @@ def make_assets_create(
 
             LOGGER.debug("asset_attrs %s", asset_attrs)
             asset = arch.assets.create(attrs=asset_attrs, props={"public": public})
+            if index is not None:
+                index.add(asset)
 
         else:
             LOGGER.info("%s already existed", display_name)
@@ -100,3 +251,76 @@ def make_assets_create(
         return asset, existed
 
     return assets_create
+
+
+def make_assets_bulk_create(
+    attachment_creator: Optional[
+        Callable[[type_helper.Archivist, AttachmentDescription], Dict]
+    ] = None,
+    public=False,
+    max_workers=BULK_WORKERS,
+):
+    """
+    Creates a function that does what the make_assets_create function does
+    for a list of AssetSpecs, using up to max_workers threads.
+
+    A BulkResult is returned for every spec, in the same order as the specs.
+    A failure is recorded in the result and does not stop the other specs.
+    Specs with the same selector are handled one after the other by the same
+    thread so that they cannot both create the asset.
+    """
+    assets_create = make_assets_create(
+        attachment_creator=attachment_creator,
+        public=public,
+    )
+
+    def create_group(arch, specs, index):
+        results = []
+        for spec in specs:
+            try:
+                asset, existed = assets_create(
+                    arch,
+                    spec.display_name,
+                    spec.asset_attrs,
+                    attachments=spec.attachments,
+                    selector_key=spec.selector_key,
+                    selector_value=spec.selector_value,
+                    index=index,
+                )
+            except Exception as ex:  # pylint: disable=broad-exception-caught
+                LOGGER.error("Creating %s failed: %s", spec.display_name, ex)
+                results.append(BulkResult(spec, error=ex))
+            else:
+                results.append(BulkResult(spec, asset=asset, existed=existed))
+
+        return results
+
+    def assets_bulk_create(
+        arch,
+        specs: List[AssetSpec],
+        *,
+        index: Optional[AssetIndex] = None,
+    ) -> List[BulkResult]:
+        groups = {}
+        for position, spec in enumerate(specs):
+            selector = (spec.selector_key, spec.selector_value or spec.display_name)
+            groups.setdefault(selector, []).append((position, spec))
+
+        results = [None] * len(specs)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (
+                    [position for position, _ in group],
+                    executor.submit(
+                        create_group, arch, [spec for _, spec in group], index
+                    ),
+                )
+                for group in groups.values()
+            ]
+            for positions, future in futures:
+                for position, result in zip(positions, future.result()):
+                    results[position] = result
+
+        return results
+
+    return assets_bulk_create
@@ -0,0 +1,84 @@
+"""Asyncio flavour of MyAsset.
+
+Every verb returns an awaitable instead of blocking, so one event loop can
+drive many simulated devices. The SDK only has a blocking client so the
+actual HTTP requests are made from a bounded pool of threads owned by an
+AsyncEmitter, which also caps how many events are in flight at once.
+"""
+
+# pylint:  disable=missing-docstring
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .asset import EVENTS, MyAsset
+from .event_template import post_event
+
+MAX_CONCURRENCY = 32
+
+
+class AsyncEmitter:
+    def __init__(self, ac, *, max_concurrency=MAX_CONCURRENCY):
+        self._ac = ac
+        self._max_concurrency = max(max_concurrency, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_concurrency, thread_name_prefix="async-events"
+        )
+        # created on first use so that it belongs to the running loop
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def create(self, asset_id, props, attrs, *, asset_attrs=None):
+        """Create an event without blocking the event loop"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                partial(
+                    self._ac.events.create,
+                    asset_id,
+                    props,
+                    attrs,
+                    asset_attrs=asset_attrs,
+                ),
+            )
+
+    async def create_body(self, asset_id, body):
+        """Create an event from its JSON body without blocking the event loop"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(post_event, self._ac, asset_id, body)
+            )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class AsyncMyAsset(MyAsset):
+    """Same verbs as MyAsset but each one returns a coroutine to be awaited"""
+
+    def __init__(self, ac, crate_id, tw, who, *, emitter):
+        super().__init__(ac, crate_id, tw, who)
+        self.emitter = emitter
+
+    def _create(self, attrs, *, asset_attrs=None):
+        # the timestamp is taken now and not when the coroutine is awaited
+        EVENTS.add()
+        return self.emitter.create(
+            self.crate_id, self._props(), attrs, asset_attrs=asset_attrs
+        )
+
+    def _create_body(self, body):
+        EVENTS.add()
+        return self.emitter.create_body(self.crate_id, body)
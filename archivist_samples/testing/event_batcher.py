@@ -0,0 +1,161 @@
+"""Queues events and creates them in batches through a pool of workers.
+
+Events are flushed when batch_size events are queued or when the oldest
+queued event is flush_interval seconds old, whichever comes first. Every
+submitted event gets a Future that resolves to the created event.
+
+Events for the same asset are always created in the order they were
+submitted: each asset is pinned to one lane and every lane is a single
+worker thread.
+"""
+
+# pylint:  disable=missing-docstring
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import logging
+from threading import Condition, Thread
+from time import monotonic
+
+from .event_template import post_event
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 1.0
+MAX_WORKERS = 8
+
+
+class EventBatcher:  # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        ac,
+        *,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        max_workers=MAX_WORKERS,
+    ):
+        self._ac = ac
+        self._batch_size = max(batch_size, 1)
+        self._flush_interval = flush_interval
+        self._lanes = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"events-{i}")
+            for i in range(max(max_workers, 1))
+        ]
+
+        self._cond = Condition()
+        self._queue = []
+        self._oldest = None
+        self._in_flight = set()
+        self._closed = False
+
+        self._timer = Thread(target=self._timer_main, daemon=True)
+        self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, asset_id, props, attrs, *, asset_attrs=None):
+        """Queue an event and return a Future for the created event"""
+        return self._submit(
+            asset_id,
+            partial(
+                self._ac.events.create, asset_id, props, attrs, asset_attrs=asset_attrs
+            ),
+        )
+
+    def submit_body(self, asset_id, body):
+        """Queue an event already encoded as JSON and return a Future"""
+        return self._submit(asset_id, partial(post_event, self._ac, asset_id, body))
+
+    def _submit(self, asset_id, create):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("cannot submit events after close()")
+
+            self._queue.append((asset_id, create, future))
+            self._in_flight.add(future)
+            if self._oldest is None:
+                self._oldest = monotonic()
+                self._cond.notify_all()
+
+            if len(self._queue) >= self._batch_size:
+                self._dispatch()
+
+        return future
+
+    def flush(self):
+        """Create all queued events and wait until every event submitted so
+        far is done. Events submitted meanwhile are not waited for.
+        """
+        with self._cond:
+            self._dispatch()
+            pending = set(self._in_flight)
+            while pending & self._in_flight:
+                self._cond.wait()
+
+    def close(self):
+        """Flush, then stop the workers. Further submits raise RuntimeError"""
+        with self._cond:
+            if self._closed:
+                return
+
+            self._closed = True
+            self._cond.notify_all()
+
+        self._timer.join()
+        self.flush()
+        for lane in self._lanes:
+            lane.shutdown(wait=True)
+
+    def _dispatch(self):
+        """Hand the queued events to the lanes. Called with the lock held"""
+        if not self._queue:
+            return
+
+        groups = {}
+        for item in self._queue:
+            groups.setdefault(item[0], []).append(item)
+
+        self._queue = []
+        self._oldest = None
+        LOGGER.debug(
+            "Flushing %d events for %d assets",
+            sum(map(len, groups.values())),
+            len(groups),
+        )
+        for asset_id, items in groups.items():
+            lane = self._lanes[hash(asset_id) % len(self._lanes)]
+            lane.submit(self._create_group, items)
+
+    def _create_group(self, items):
+        for asset_id, create, future in items:
+            try:
+                event = create()
+            except Exception as ex:  # pylint: disable=broad-exception-caught
+                LOGGER.error("Event for %s failed: %s", asset_id, ex)
+                future.set_exception(ex)
+            else:
+                future.set_result(event)
+
+            with self._cond:
+                self._in_flight.discard(future)
+                self._cond.notify_all()
+
+    def _timer_main(self):
+        with self._cond:
+            while not self._closed:
+                if self._oldest is None:
+                    self._cond.wait()
+                    continue
+
+                remaining = self._oldest + self._flush_interval - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+                self._dispatch()
@@ -0,0 +1,155 @@
+"""Events encoded from templates serialised in advance.
+
+A template is the body of an event with holes for the values that vary.
+It is serialised to JSON once, so encoding an event only encodes those
+values and joins them with the constant fragments around them, instead
+of building nested dicts for the SDK to copy and serialise every time.
+
+ENCODING records how long encoding takes, per template, once enabled. Each
+event is encoded both ways so the two can be compared like for like.
+"""
+
+# pylint:  disable=missing-docstring
+
+import atexit
+import json
+import logging
+import re
+from threading import Lock
+
+from archivist.constants import ASSETS_SUBPATH, EVENTS_LABEL
+from archivist.events import Event
+
+LOGGER = logging.getLogger(__name__)
+
+HOLE_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+def hole(name):
+    """Placeholder for the value called name. It must be a whole value"""
+    return f"\0{name}\0"
+
+
+def _fill(value, values):
+    if isinstance(value, dict):
+        return {k: _fill(v, values) for k, v in value.items()}
+
+    if isinstance(value, str) and value.startswith("\0") and value.endswith("\0"):
+        return values[value[1:-1]]
+
+    return value
+
+
+class EventTemplate:
+    def __init__(self, name, props, attrs, asset_attrs=None):
+        self.name = name
+        self._props = props
+        self._attrs = attrs
+        self._asset_attrs = asset_attrs
+
+        body = {**props, "event_attributes": attrs}
+        if asset_attrs:
+            body["asset_attributes"] = asset_attrs
+
+        # the JSON is split into constant fragments and the names of the
+        # holes between them
+        parts = HOLE_PATTERN.split(json.dumps(body, separators=(",", ":")))
+        self._fragments = [part.encode() for part in parts[0::2]]
+        self._holes = parts[1::2]
+
+    def render(self, values):
+        """The JSON body of the event with the holes filled from values"""
+        chunks = [self._fragments[0]]
+        for name, fragment in zip(self._holes, self._fragments[1:]):
+            chunks.append(json.dumps(values[name]).encode())
+            chunks.append(fragment)
+
+        return b"".join(chunks)
+
+    def attributes(self, values):
+        """(event attributes, asset attributes) with the holes filled"""
+        return (
+            _fill(self._attrs, values),
+            _fill(self._asset_attrs, values) if self._asset_attrs else None,
+        )
+
+    def event(self, values):
+        """The body of the event as dicts with the holes filled"""
+        attrs, asset_attrs = self.attributes(values)
+        body = {**_fill(self._props, values), "event_attributes": attrs}
+        if asset_attrs:
+            body["asset_attributes"] = asset_attrs
+
+        return body
+
+
+def post_event(ac, asset_id, body):
+    """Create an event from a body already encoded as JSON"""
+    LOGGER.debug("Create Event %s/%s", asset_id, body)
+    return Event(
+        **ac.post(
+            f"{ac.root}/{ASSETS_SUBPATH}/{asset_id}/{EVENTS_LABEL}",
+            body,
+            headers=HEADERS,
+            data=True,
+        )
+    )
+
+
+class EncodeProfile:
+    """Nanoseconds taken to encode each event, by template and encoding
+
+    The encoding is "template" for the rendered template and "dict" for
+    the dicts the SDK would copy and serialise for the same event.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = Lock()
+        self._stats = {}  # (name, encoding) -> [events, total ns, max ns]
+
+    def enable(self):
+        """Start timing and log the summary when the process exits"""
+        if not self.enabled:
+            self.enabled = True
+            atexit.register(self.log)
+
+    def add(self, name, encoding, ns):
+        with self._lock:
+            stats = self._stats.setdefault((name, encoding), [0, 0, 0])
+            stats[0] += 1
+            stats[1] += ns
+            stats[2] = max(stats[2], ns)
+
+    def summary(self):
+        """Events, mean and max microseconds to encode each one, by template
+        and then encoding
+        """
+        summary = {}
+        with self._lock:
+            for (name, encoding), (events, total, most) in sorted(self._stats.items()):
+                summary.setdefault(name, {})[encoding] = {
+                    "events": events,
+                    "mean_us": round(total / events / 1000, 2),
+                    "max_us": round(most / 1000, 2),
+                }
+
+        return summary
+
+    def log(self):
+        for name, encodings in self.summary().items():
+            for encoding, stats in encodings.items():
+                LOGGER.info(
+                    "Encoded %d %s events from %s in %.2fus on average (max %.2fus)",
+                    stats["events"],
+                    name,
+                    encoding,
+                    stats["mean_us"],
+                    stats["max_us"],
+                )
+
+
+# shared by all the assets of a process
+ENCODING = EncodeProfile()
@@ -0,0 +1,40 @@
+"""JSON files that samples use to remember things between runs.
+
+Files are replaced atomically so an interrupted run never leaves a
+truncated file behind.
+"""
+
+# pylint:  disable=missing-docstring
+
+import json
+import logging
+from os import path as os_path
+from os import replace
+from tempfile import NamedTemporaryFile
+
+LOGGER = logging.getLogger(__name__)
+
+
+def load_json(path, what="file"):
+    """The contents of the JSON file at path, or {} if it does not exist
+    or cannot be read
+    """
+    try:
+        with open(path, mode="r", encoding="utf-8") as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        LOGGER.warning("Ignoring unreadable %s %s", what, path)
+        return {}
+
+
+def save_json(path, data):
+    """Atomically replace the JSON file at path with data"""
+    directory = os_path.dirname(os_path.abspath(path))
+    with NamedTemporaryFile(
+        mode="w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False
+    ) as fd:
+        json.dump(data, fd, indent=2, sort_keys=True)
+
+    replace(fd.name, path)
@@ -0,0 +1,137 @@
+"""Runs a graph of dependent tasks concurrently.
+
+Each task names the tasks that must finish before it starts. Tasks whose
+dependencies are done run in parallel, up to a limit, and the progress and
+elapsed time of every phase (a label shared by related tasks) is logged.
+"""
+
+# pylint:  disable=missing-docstring
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    after: Tuple[str, ...] = ()
+    phase: Optional[str] = None
+
+
+@dataclass
+class Phase:
+    total: int = 0
+    done: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+
+class PlanError(Exception):
+    """A task failed or the plan cannot be run"""
+
+
+class Plan:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max(max_workers, 1)
+        self.tasks = {}
+        self.results = {}
+
+    def add(self, name, fn, *args, after=(), phase=None, **kwargs):
+        """Call fn(*args, **kwargs) once all the tasks named in after are done"""
+        if name in self.tasks:
+            raise PlanError(f"Task {name} already in plan")
+
+        self.tasks[name] = Task(name, fn, args, kwargs, tuple(after), phase)
+        return name
+
+    def _check(self):
+        for task in self.tasks.values():
+            for dependency in task.after:
+                if dependency not in self.tasks:
+                    raise PlanError(f"Task {task.name} needs unknown task {dependency}")
+
+    def run(self):
+        """
+        Run every task and return their results by name. If a task fails
+        no more tasks are started and PlanError is raised once the running
+        ones have finished.
+        """
+        self._check()
+        phases = {}
+        for task in self.tasks.values():
+            phases.setdefault(task.phase, Phase()).total += 1
+
+        waiting = dict(self.tasks)
+        running = {}
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                if not failed:
+                    self._start_ready(executor, waiting, running, phases)
+
+                if not running:
+                    if waiting and not failed:
+                        raise PlanError(
+                            f"Tasks {', '.join(waiting)} depend on each other"
+                        )
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        self.results[task.name] = future.result()
+                    except Exception as ex:  # pylint: disable=broad-except
+                        LOGGER.error("Task %s failed: %s", task.name, ex)
+                        failed.append(task.name)
+                        continue
+
+                    self._finished(task, phases[task.phase])
+
+        for name, phase in phases.items():
+            if phase.finished is not None:
+                LOGGER.info(
+                    "Phase %s: %d tasks in %.2fs",
+                    name,
+                    phase.done,
+                    phase.finished - phase.started,
+                )
+
+        if failed:
+            raise PlanError(f"Tasks {', '.join(failed)} failed")
+
+        return self.results
+
+    def _start_ready(self, executor, waiting, running, phases):
+        for name, task in list(waiting.items()):
+            if all(dependency in self.results for dependency in task.after):
+                del waiting[name]
+                phase = phases[task.phase]
+                if phase.started is None:
+                    phase.started = time.perf_counter()
+
+                future = executor.submit(task.fn, *task.args, **task.kwargs)
+                running[future] = task
+
+    @staticmethod
+    def _finished(task, phase):
+        phase.done += 1
+        phase.finished = time.perf_counter()
+        LOGGER.info(
+            "%s [%d/%d] %s done after %.2fs",
+            task.phase,
+            phase.done,
+            phase.total,
+            task.name,
+            phase.finished - phase.started,
+        )
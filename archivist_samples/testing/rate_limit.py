@@ -0,0 +1,46 @@
+"""Token bucket rate limiter.
+
+Shared by all the threads of a sample so that together they stay below
+the rate at which DataTrails starts throttling the tenancy.
+"""
+
+# pylint:  disable=missing-docstring
+
+from threading import Lock
+import time
+
+
+class TokenBucket:
+    """Allows rate calls per second on average and bursts of up to burst calls"""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self._rate = rate
+        self._burst = burst if burst is not None else max(rate, 1)
+        self._lock = Lock()
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self):
+        """Calls allowed per second"""
+        return self._rate
+
+    def acquire(self, tokens=1):
+        """Wait until tokens are available and take them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+
+            # take the tokens now, going into debt if need be, so that
+            # waiting callers are served in the order they arrived
+            self._tokens -= tokens
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
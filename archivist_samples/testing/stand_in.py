@@ -0,0 +1,597 @@
+"""Local stand-in for the parts of the DataTrails REST API used by the samples.
+
+Serves assets, events and attachments (blobs) from memory so that every
+sample can be run, profiled or load tested without a DataTrails tenancy.
+Point any sample at it with the usual arguments:
+
+    python3 -m archivist_samples.testing.stand_in --port 8080 &
+    archivist_samples_estate_info -u http://127.0.0.1:8080 -t token --quick-count
+
+The auth token file must exist but its contents are not checked.
+
+Latency and errors can be injected to see how the samples behave against a
+slow or throttling service. Injected errors default to 429 which the
+datatrails-archivist package retries after the advertised delay.
+"""
+
+# pylint:  disable=missing-docstring
+
+import argparse
+from collections import OrderedDict, deque
+from copy import deepcopy
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+import uuid
+
+from archivist.logger import set_logger
+
+LOGGER = logging.getLogger(__name__)
+
+ROOT = "/archivist"
+ASSETS_PATH = f"{ROOT}/v2/assets"
+BLOBS_PATH = f"{ROOT}/v1/blobs"
+
+# page size used by list requests that do not specify one
+DEFAULT_PAGE_SIZE = 100
+
+# number of open list cursors kept before the oldest is forgotten
+MAX_CURSORS = 1024
+
+# list parameters that are not selectors
+NON_SELECTORS = ("page_size", "page_token", "order_by")
+
+TENANT = "tenant/00000000-0000-0000-0000-000000000000"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _lookup(record, dotted):
+    """Find a (possibly nested) value from a dot delimited query parameter"""
+    value = record
+    for key in dotted.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+
+        value = value[key]
+
+    return value
+
+
+def _matches(record, selectors):
+    for key, wanted in selectors:
+        value = _lookup(record, key)
+        if value is None:
+            return False
+
+        # '*' only requires that the value exists
+        if wanted != "*" and str(value) != wanted:
+            return False
+
+    return True
+
+
+class StandInStore:  # pylint: disable=too-many-instance-attributes
+    """In-memory assets, events and blobs plus the confirmation schedule"""
+
+    def __init__(self, *, confirm_delay=0.0, page_size=DEFAULT_PAGE_SIZE):
+        self.confirm_delay = confirm_delay
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._assets = {}
+        self._events = {}
+        self._blobs = {}
+        self._pending = deque()
+        self._cursors = OrderedDict()
+
+    def _confirm(self):
+        """Confirm every pending entity whose confirmation delay has elapsed"""
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            _, record = self._pending.popleft()
+            record["confirmation_status"] = "CONFIRMED"
+
+    def _stored(self, record):
+        if self.confirm_delay > 0:
+            record["confirmation_status"] = "PENDING"
+            self._pending.append((time.monotonic() + self.confirm_delay, record))
+        else:
+            record["confirmation_status"] = "CONFIRMED"
+
+        return deepcopy(record)
+
+    def create_asset(self, body):
+        identity = f"assets/{uuid.uuid4()}"
+        record = {
+            "identity": identity,
+            "behaviours": body.get("behaviours", ["RecordEvidence"]),
+            "attributes": body.get("attributes", {}),
+            "public": body.get("public", False),
+            "tracked": "TRACKED",
+            "owner": "",
+            "at_time": _now(),
+            "storage_integrity": "TENANT_STORAGE",
+            "proof_mechanism": "MERKLE_LOG",
+            "tenant_identity": TENANT,
+        }
+        with self._lock:
+            self._assets[identity] = record
+            self._events[identity] = []
+            return self._stored(record)
+
+    def create_event(self, asset_id, body):
+        now = _now()
+        with self._lock:
+            asset = self._assets.get(asset_id)
+            if asset is None:
+                return None
+
+            record = {
+                "identity": f"{asset_id}/events/{uuid.uuid4()}",
+                "asset_identity": asset_id,
+                "operation": body.get("operation", "Record"),
+                "behaviour": body.get("behaviour", "RecordEvidence"),
+                "event_attributes": body.get("event_attributes", {}),
+                "asset_attributes": body.get("asset_attributes", {}),
+                "timestamp_declared": body.get("timestamp_declared", now),
+                "timestamp_accepted": now,
+                "timestamp_committed": now,
+                "principal_declared": body.get("principal_declared", {}),
+                "principal_accepted": {},
+                "tenant_identity": TENANT,
+            }
+            asset["attributes"].update(record["asset_attributes"])
+            self._events[asset_id].append(record)
+            return self._stored(record)
+
+    def create_blob(self, data, mime_type):
+        identity = f"blobs/{uuid.uuid4()}"
+        record = {
+            "identity": identity,
+            "hash": {"alg": "SHA256", "value": sha256(data).hexdigest()},
+            "mime_type": mime_type,
+            "size": len(data),
+            "timestamp_accepted": _now(),
+            "tenant_identity": TENANT,
+        }
+        with self._lock:
+            self._blobs[identity] = (record, data)
+
+        return deepcopy(record)
+
+    def read_asset(self, identity):
+        with self._lock:
+            self._confirm()
+            record = self._assets.get(identity)
+            return deepcopy(record) if record is not None else None
+
+    def read_event(self, identity):
+        asset_id = identity.split("/events/")[0]
+        with self._lock:
+            self._confirm()
+            for record in self._events.get(asset_id, ()):
+                if record["identity"] == identity:
+                    return deepcopy(record)
+
+        return None
+
+    def read_blob(self, identity):
+        with self._lock:
+            return self._blobs.get(identity)
+
+    def count(self, collection, asset_id, selectors):
+        with self._lock:
+            self._confirm()
+            return sum(
+                1 for r in self._records(collection, asset_id) if _matches(r, selectors)
+            )
+
+    def _records(self, collection, asset_id):
+        if collection == "assets":
+            return self._assets.values()
+
+        if asset_id != "assets/-":
+            return self._events.get(asset_id, ())
+
+        return (e for events in self._events.values() for e in events)
+
+    def page(self, collection, asset_id, selectors, *, page_size, page_token):
+        """Returns one page of matching records and the token for the next"""
+        with self._lock:
+            self._confirm()
+            if page_token:
+                cursor = self._cursors.pop(page_token, None)
+                if cursor is None:
+                    return [], None
+
+                records, offset = cursor
+
+            else:
+                # newest first
+                records = [
+                    r
+                    for r in self._records(collection, asset_id)
+                    if _matches(r, selectors)
+                ]
+                records.reverse()
+                offset = 0
+
+            size = page_size or self.page_size
+            page = deepcopy(records[offset : offset + size])
+            next_token = None
+            if offset + size < len(records):
+                next_token = str(uuid.uuid4())
+                self._cursors[next_token] = (records, offset + size)
+                while len(self._cursors) > MAX_CURSORS:
+                    self._cursors.popitem(last=False)
+
+            return page, next_token
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients that go away mid-request (e.g. a killed sample) are expected
+        LOGGER.debug("Connection from %s failed", client_address, exc_info=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately so don't wait for ACKs
+    disable_nagle_algorithm = True
+
+    # set by StandInServer
+    store: StandInStore
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    error_status = 429
+    retry_after = 0.1
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOGGER.debug("%s %s", self.address_string(), format % args)
+
+    def _send(self, status, body=b"", *, headers=None, mtype="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", mtype)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, {"code": status, "message": message})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _injected(self):
+        """Simulates network latency and sometimes fails the request"""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.error_rate and random.random() < self.error_rate:
+            headers = None
+            if self.error_status == 429:
+                headers = {"Archivist-Rate-Limit-Reset": str(self.retry_after)}
+
+            self._send(
+                self.error_status,
+                {"code": self.error_status, "message": "injected error"},
+                headers=headers,
+            )
+            return True
+
+        return False
+
+    # pylint: disable=invalid-name,too-many-return-statements
+    def do_GET(self):
+        # the body of a GET is never used but must be drained for keep-alive
+        self._read_body()
+        if self._injected():
+            return
+
+        url = urlsplit(self.path)
+        path = url.path
+        params = parse_qsl(url.query)
+
+        if path.startswith(BLOBS_PATH + "/"):
+            self._get_blob(path[len(ROOT) + 4 :])
+            return
+
+        if not path.startswith(ASSETS_PATH):
+            self._error(404, f"{path} not found")
+            return
+
+        parts = path[len(ROOT) + 4 :].split("/")
+        # assets
+        if len(parts) == 1:
+            self._list("assets", None, params)
+            return
+
+        asset_id = "/".join(parts[:2])
+        # assets/xxxx
+        if len(parts) == 2:
+            self._found(self.store.read_asset(asset_id))
+            return
+
+        # assets/xxxx/events
+        if len(parts) == 3 and parts[2] == "events":
+            self._list("events", asset_id, params)
+            return
+
+        # assets/xxxx/events/yyyy
+        if len(parts) == 4 and parts[2] == "events":
+            self._found(self.store.read_event("/".join(parts)))
+            return
+
+        self._error(404, f"{path} not found")
+
+    def do_POST(self):
+        body = self._read_body()
+        if self._injected():
+            return
+
+        path = urlsplit(self.path).path
+
+        if path == BLOBS_PATH:
+            self._post_blob(body)
+            return
+
+        try:
+            request = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            self._error(400, "request body is not json")
+            return
+
+        if path == ASSETS_PATH:
+            self._send(200, self.store.create_asset(request))
+            return
+
+        parts = path[len(ROOT) + 4 :].split("/")
+        if len(parts) == 3 and parts[0] == "assets" and parts[2] == "events":
+            self._found(self.store.create_event("/".join(parts[:2]), request))
+            return
+
+        self._error(404, f"{path} not found")
+
+    def _found(self, record):
+        if record is None:
+            self._error(404, "not found")
+            return
+
+        self._send(200, record)
+
+    def _list(self, collection, asset_id, params):
+        selectors = [(k, v) for k, v in params if k not in NON_SELECTORS]
+        options = dict(params)
+
+        if self.headers.get("X-Request-Total-Count") == "true":
+            count = self.store.count(collection, asset_id, selectors)
+            self._send(
+                200,
+                {collection: [], "next_page_token": ""},
+                headers={"X-Total-Count": str(count)},
+            )
+            return
+
+        page_size = int(options["page_size"]) if "page_size" in options else None
+        records, next_token = self.store.page(
+            collection,
+            asset_id,
+            selectors,
+            page_size=page_size,
+            page_token=options.get("page_token"),
+        )
+        self._send(200, {collection: records, "next_page_token": next_token or ""})
+
+    def _post_blob(self, body):
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n"
+        message = BytesParser(policy=HTTP).parsebytes(header.encode("utf-8") + body)
+        if not message.is_multipart():
+            self._error(400, "expected multipart upload")
+            return
+
+        for part in message.iter_parts():
+            data = part.get_payload(decode=True) or b""
+            self._send(200, self.store.create_blob(data, part.get_content_type()))
+            return
+
+        self._error(400, "no file in upload")
+
+    def _get_blob(self, path):
+        info = path.endswith("/info")
+        blob = self.store.read_blob(path[: -len("/info")] if info else path)
+        if blob is None:
+            self._error(404, f"{path} not found")
+            return
+
+        record, data = blob
+        if info:
+            self._send(200, record)
+            return
+
+        self._send(200, data, mtype=record["mime_type"] or "application/octet-stream")
+
+
+class StandInServer:
+    """Threaded HTTP server that serves a StandInStore
+
+    Use as a context manager or call start() and stop(). The url property
+    is suitable for passing to Archivist or the --url argument.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        *,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        error_status=429,
+        confirm_delay=0.0,
+        page_size=DEFAULT_PAGE_SIZE,
+    ):
+        self.store = StandInStore(confirm_delay=confirm_delay, page_size=page_size)
+        handler = type(
+            "StandInHandler",
+            (_Handler,),
+            {
+                "store": self.store,
+                "latency": latency,
+                "jitter": jitter,
+                "error_rate": error_rate,
+                "error_status": error_status,
+            },
+        )
+        self._server = _Server((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        LOGGER.info("Stand-in DataTrails serving at %s", self.url)
+        return self
+
+    def serve_forever(self):
+        LOGGER.info("Stand-in DataTrails serving at %s", self.url)
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serves an in-memory stand-in for DataTrails",
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        dest="host",
+        action="store",
+        default="127.0.0.1",
+        help="address to listen on",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        dest="port",
+        action="store",
+        default=8080,
+        help="port to listen on",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        dest="latency",
+        action="store",
+        default=0.0,
+        help="seconds added to every response",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        dest="jitter",
+        action="store",
+        default=0.0,
+        help="up to this many random seconds added to the latency",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        dest="error_rate",
+        action="store",
+        default=0.0,
+        help="fraction of requests that fail (0.0 - 1.0)",
+    )
+    parser.add_argument(
+        "--error-status",
+        type=int,
+        dest="error_status",
+        action="store",
+        default=429,
+        help="HTTP status of failed requests",
+    )
+    parser.add_argument(
+        "--confirm-delay",
+        type=float,
+        dest="confirm_delay",
+        action="store",
+        default=0.0,
+        help="seconds before created assets and events are CONFIRMED",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        dest="page_size",
+        action="store",
+        default=DEFAULT_PAGE_SIZE,
+        help="default number of records in each page of a list",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        default=False,
+        help="print verbose debugging",
+    )
+
+    args = parser.parse_args()
+
+    set_logger("DEBUG" if args.verbose else "INFO")
+
+    server = StandInServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        confirm_delay=args.confirm_delay,
+        page_size=args.page_size,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("Stand-in DataTrails stopped")
+
+
+if __name__ == "__main__":
+    main()
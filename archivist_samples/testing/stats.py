@@ -0,0 +1,15 @@
+"""Statistics shared by the samples and the benchmarks."""
+
+# pylint:  disable=missing-docstring
+
+from math import ceil
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an ordered sequence, or None if it is
+    empty. percent is taken from 0 to 100 so whole percents rank exactly.
+    """
+    if not ordered:
+        return None
+
+    return ordered[max(ceil(percent * len(ordered) / 100), 1) - 1]
@@ -1,17 +1,263 @@
 """Simulates accelerated time for creating plausible logs quickly"""
 
 import datetime
+import heapq
+from itertools import count
+import logging
+from threading import BoundedSemaphore, Condition, Lock
+import time
 
+LOGGER = logging.getLogger(__name__)
 
-class TimeWarp:  # pylint: disable=too-few-public-methods
-    """Stretches time"""
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MICROSECOND = 1000
 
-    def __init__(self, start, ffwd):
-        self._start_time = datetime.datetime.now()
-        self._origin = start
+# how long to sleep at a time when there is nothing to wait for
+IDLE_SLEEP = 3600.0
+
+
+def as_datetime(value):
+    """A date is taken to mean midnight at the start of that day"""
+    if isinstance(value, datetime.datetime):
+        return value
+
+    return datetime.datetime.combine(value, datetime.time())
+
+
+class TimeWarp:  # pylint: disable=too-many-instance-attributes
+    """Stretches time
+
+    Warped time is derived from time.monotonic_ns so it never jumps when the
+    wall clock is adjusted, and at() gives the inverse: the monotonic time at
+    which a given warped time is reached.
+
+    If virtual is True the warp is driven by a virtual clock instead that
+    only moves when sleep(), sleep_until() or advance_to() is called, so
+    sleeping takes no real time at all.
+
+    The monotonic clock is shared by all the processes on a machine, so
+    warps in several processes created with the same start_ns (the
+    start_ns of the first warp) agree on the warped time.
+    """
+
+    def __init__(self, start, ffwd, *, virtual=False, start_ns=None):
+        self._origin = as_datetime(start)
         self._rate = ffwd
+        self._virtual = virtual
+        self._lock = Lock()
+        self._virtual_ns = 0
+        if virtual:
+            self._start_ns = 0
+        else:
+            self._start_ns = start_ns if start_ns is not None else time.monotonic_ns()
+        # warped microseconds per real nanosecond and the inverse
+        self._us_per_ns = ffwd / NS_PER_MICROSECOND
+        self._ns_per_us = NS_PER_MICROSECOND / ffwd
+
+    @property
+    def origin(self):
+        """Warped time when the warp was created"""
+        return self._origin
+
+    @property
+    def start_ns(self):
+        """Clock value when the warp was created"""
+        return self._start_ns
+
+    @property
+    def rate(self):
+        """Warped seconds per real second"""
+        return self._rate
+
+    @property
+    def virtual(self):
+        """True if the warp is driven by a virtual clock"""
+        return self._virtual
+
+    def clock_ns(self):
+        """The clock the warp is driven from"""
+        if self._virtual:
+            return self._virtual_ns
+
+        return time.monotonic_ns()
+
+    def advance_to(self, clock_ns):
+        """Move the virtual clock forward to clock_ns"""
+        if not self._virtual:
+            raise ValueError("only a virtual clock can be advanced")
+
+        with self._lock:
+            self._virtual_ns = max(self._virtual_ns, clock_ns)
 
     def now(self):
         """Get the warped time"""
-        delta = (datetime.datetime.now() - self._start_time).total_seconds()
-        return self._origin + datetime.timedelta(seconds=delta * self._rate)
+        return self.warp(self.clock_ns())
+
+    def warp(self, clock_ns):
+        """Warped time at the clock_ns value"""
+        return self._origin + datetime.timedelta(
+            microseconds=(clock_ns - self._start_ns) * self._us_per_ns
+        )
+
+    def at(self, warped):
+        """The clock_ns value at which the warp reaches warped"""
+        delta = as_datetime(warped) - self._origin
+        return self._start_ns + int(
+            (delta // datetime.timedelta(microseconds=1)) * self._ns_per_us
+        )
+
+    def sleep(self, seconds):
+        """Sleep for seconds of real (or virtual) time"""
+        if self._virtual:
+            self.advance_to(self.clock_ns() + int(seconds * NS_PER_SECOND))
+        else:
+            time.sleep(seconds)
+
+    def sleep_until(self, warped):
+        """Sleep until the warp reaches warped"""
+        if self._virtual:
+            self.advance_to(self.at(warped))
+            return
+
+        remaining = self.at(warped) - self.clock_ns()
+        if remaining > 0:
+            time.sleep(remaining / NS_PER_SECOND)
+
+
+class Scheduler:
+    """Calls functions when their deadline is reached
+
+    Deadlines are either warped times (schedule_at) or real delays
+    (schedule_after). The thread calling run() sleeps exactly until the
+    next deadline instead of polling. If an executor is given the functions
+    are submitted to it, otherwise they are called by the run() thread.
+    At most max_pending functions are submitted and not yet finished; the
+    run() thread waits for one to finish before submitting another so
+    that late work queues up in the heap rather than in the executor.
+
+    With a virtual TimeWarp it is a discrete event simulation: run() moves
+    the clock straight to the next deadline and always calls the functions
+    itself, one at a time, so a seeded simulation is reproducible. It
+    returns when nothing is left to do.
+
+    A function that raises is logged either way and the others carry on.
+    """
+
+    def __init__(self, tw, executor=None, *, max_pending=None):
+        self._tw = tw
+        self._executor = executor
+        self._pending = (
+            BoundedSemaphore(max_pending) if max_pending is not None else None
+        )
+        self._cond = Condition()
+        self._heap = []
+        self._sequence = count()
+        self._stopped = False
+
+    @property
+    def tw(self):
+        """The TimeWarp deadlines are measured with"""
+        return self._tw
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def schedule_at(self, warped, fn, *args):
+        """Call fn(*args) when the warp reaches warped"""
+        self._push(self._tw.at(warped), fn, args)
+
+    def schedule_after(self, seconds, fn, *args):
+        """Call fn(*args) after seconds of real time"""
+        self._push(
+            self._tw.clock_ns() + int(seconds * NS_PER_SECOND),
+            fn,
+            args,
+        )
+
+    def stop(self):
+        """Make run() return"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def run(self, until=None):
+        """Call the functions as they fall due until the warp reaches until
+        (a warped time) or stop() is called
+        """
+        stop_ns = self._tw.at(until) if until is not None else None
+        while True:
+            with self._cond:
+                entry = self._next_due(stop_ns)
+                if entry is None:
+                    return
+
+            _, _, fn, args = entry
+            if self._executor is not None and not self._tw.virtual:
+                self._submit(fn, args)
+                continue
+
+            try:
+                fn(*args)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.error("Scheduled function failed", exc_info=True)
+
+    def _submit(self, fn, args):
+        if self._pending is not None:
+            self._pending.acquire()  # pylint: disable=consider-using-with
+
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        if self._pending is not None:
+            self._pending.release()
+
+        if not future.cancelled() and future.exception() is not None:
+            LOGGER.error("Scheduled function failed", exc_info=future.exception())
+
+    def _push(self, deadline_ns, fn, args):
+        with self._cond:
+            heapq.heappush(self._heap, (deadline_ns, next(self._sequence), fn, args))
+            # the new entry may be due before the one being waited for
+            if self._heap[0][0] == deadline_ns:
+                self._cond.notify_all()
+
+    def _next_due(self, stop_ns):
+        """Wait for the next due entry. Called with the lock held.
+
+        Returns None when it is time to stop.
+        """
+        if self._tw.virtual:
+            return self._next_virtual(stop_ns)
+
+        while not self._stopped:
+            now = self._tw.clock_ns()
+            if stop_ns is not None and now >= stop_ns:
+                return None
+
+            deadline = self._heap[0][0] if self._heap else None
+            if deadline is not None and deadline <= now:
+                return heapq.heappop(self._heap)
+
+            if deadline is None or (stop_ns is not None and stop_ns < deadline):
+                deadline = stop_ns
+
+            timeout = (
+                (deadline - now) / NS_PER_SECOND if deadline is not None else IDLE_SLEEP
+            )
+            self._cond.wait(timeout)
+
+        return None
+
+    def _next_virtual(self, stop_ns):
+        if self._stopped or not self._heap:
+            return None
+
+        deadline = self._heap[0][0]
+        if stop_ns is not None and deadline >= stop_ns:
+            self._tw.advance_to(stop_ns)
+            return None
+
+        self._tw.advance_to(deadline)
+        return heapq.heappop(self._heap)
@@ -0,0 +1,133 @@
+"""Uploads each distinct packaged file only once.
+
+Files are identified by the SHA-256 of their contents, so uploading the
+same image for every asset or event results in a single blob per
+DataTrails URL. Optionally the blobs are remembered across runs in a JSON
+file. Blobs from previous runs are checked with attachments.info before
+they are reused.
+"""
+
+# pylint:  disable=missing-docstring
+
+from concurrent.futures import Future
+import hashlib
+import importlib.resources as res
+import logging
+from threading import Lock
+
+from archivist.errors import ArchivistError
+
+from .json_file import load_json, save_json
+
+LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 65536
+
+
+def sha256_of(resource):
+    """Hex SHA-256 of a file or importlib.resources traversable"""
+    digest = hashlib.sha256()
+    with resource.open("rb") as fd:
+        for chunk in iter(lambda: fd.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class UploadCache:
+    def __init__(self, path=None):
+        self._lock = Lock()
+        self._digests = {}  # (package, name) -> sha256
+        self._blobs = {}  # key -> Future of the blob
+        self._stored = {}  # key -> blob remembered in path
+        self._path = None
+        if path is not None:
+            self.load(path)
+
+    def load(self, path):
+        """Remember blobs across runs in the JSON file at path"""
+        stored = load_json(path, "upload cache")
+        with self._lock:
+            self._path = path
+            self._stored = stored
+
+    def upload(self, arch, package, name, *, mtype=None):
+        """
+        Upload the file name from package unless the same contents were
+        already uploaded to the same URL. Returns the blob as returned by
+        arch.attachments.upload.
+        """
+        resource = res.files(package).joinpath(name)
+        digest_key = (getattr(package, "__name__", package), name)
+        with self._lock:
+            sha = self._digests.get(digest_key)
+
+        if sha is None:
+            sha = sha256_of(resource)
+            with self._lock:
+                self._digests[digest_key] = sha
+
+        key = f"{arch.url} {sha} {mtype or ''}"
+        with self._lock:
+            future = self._blobs.get(key)
+            owner = future is None
+            if owner:
+                future = self._blobs[key] = Future()
+
+        # someone else is uploading (or has uploaded) the same contents
+        if not owner:
+            return future.result()
+
+        try:
+            blob = self._reuse(arch, key, sha)
+            if blob is None:
+                blob = self._upload(arch, resource, key, mtype)
+
+        except BaseException as ex:
+            # allow a later call to try again
+            with self._lock:
+                del self._blobs[key]
+
+            future.set_exception(ex)
+            raise
+
+        future.set_result(blob)
+        return blob
+
+    def _reuse(self, arch, key, sha):
+        with self._lock:
+            blob = self._stored.get(key)
+
+        if blob is None:
+            return None
+
+        try:
+            info = arch.attachments.info(blob["identity"])
+        except ArchivistError as ex:
+            LOGGER.debug("Cached blob %s unusable: %s", blob["identity"], ex)
+            return None
+
+        if info.get("hash", {}).get("value") != sha:
+            return None
+
+        LOGGER.debug("Reusing blob %s", blob["identity"])
+        return blob
+
+    def _upload(self, arch, resource, key, mtype):
+        with resource.open("rb") as fd:
+            blob = arch.attachments.upload(fd, mtype=mtype)
+
+        with self._lock:
+            if self._path is not None:
+                self._stored[key] = dict(blob)
+                save_json(self._path, self._stored)
+
+        return blob
+
+
+# shared by all samples so that identical files are uploaded once per run
+upload_cache = UploadCache()
+
+
+def upload_from_package(arch, package, name, *, mtype=None):
+    return upload_cache.upload(arch, package, name, mtype=mtype)
@@ -0,0 +1,9 @@
+# pylint: disable=missing-docstring
+
+from sys import exit as sys_exit
+
+from .run import main
+
+if __name__ == "__main__":
+    # execute only if run as a script
+    sys_exit(main())
@@ -0,0 +1,112 @@
+"""Records every HTTP call made through requests while a sample runs.
+
+Calls are grouped by the kind of Archivist operation they perform so that
+reports can show, for example, how many asset creates a sample issues and
+how long they take.
+"""
+
+# pylint:  disable=missing-docstring
+
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from urllib.parse import parse_qs, urlsplit
+
+from requests import Session
+
+from archivist_samples.testing.stats import percentile
+
+# upper bounds in milliseconds of the latency histogram buckets
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def operation(request):
+    """Classify a prepared request as create/read/list/count/upload"""
+    url = urlsplit(request.url)
+    path = url.path.rstrip("/")
+
+    if request.method == "POST":
+        return "upload" if path.endswith("/blobs") else "create"
+
+    if request.method != "GET":
+        return request.method.lower()
+
+    if request.headers.get("X-Request-Total-Count") == "true":
+        return "count"
+
+    # read_by_signature lists with a page size of 2 to detect duplicates
+    if parse_qs(url.query).get("page_size") == ["2"]:
+        return "read"
+
+    if path.endswith("/assets") or path.endswith("/events"):
+        return "list"
+
+    return "read"
+
+
+def histogram(ordered):
+    counts = {}
+    i = 0
+    for bound in BUCKETS_MS:
+        n = 0
+        while i < len(ordered) and ordered[i] <= bound:
+            n += 1
+            i += 1
+
+        counts[f"<={bound}ms"] = n
+
+    counts[f">{BUCKETS_MS[-1]}ms"] = len(ordered) - i
+    return counts
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = Lock()
+        self._latencies = {}
+        self._errors = {}
+
+    def record(self, op, elapsed_ms, status):
+        with self._lock:
+            self._latencies.setdefault(op, []).append(elapsed_ms)
+            if status >= 400:
+                self._errors[op] = self._errors.get(op, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            latencies = {k: sorted(v) for k, v in self._latencies.items()}
+            errors = dict(self._errors)
+
+        return {
+            op: {
+                "calls": len(ordered),
+                "errors": errors.get(op, 0),
+                "p50_ms": percentile(ordered, 50),
+                "p95_ms": percentile(ordered, 95),
+                "p99_ms": percentile(ordered, 99),
+                "max_ms": ordered[-1],
+                "histogram": histogram(ordered),
+            }
+            for op, ordered in latencies.items()
+        }
+
+    @contextmanager
+    def installed(self):
+        """Time every requests.Session.send until the context exits"""
+        send = Session.send
+        recorder = self
+
+        def timed_send(session, request, **kwargs):
+            start = perf_counter()
+            response = send(session, request, **kwargs)
+            recorder.record(
+                operation(request),
+                (perf_counter() - start) * 1000.0,
+                response.status_code,
+            )
+            return response
+
+        Session.send = timed_send
+        try:
+            yield self
+        finally:
+            Session.send = send
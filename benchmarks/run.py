@@ -0,0 +1,370 @@
+"""Runs each benchmark scenario in its own process and reports the results.
+
+Every scenario is run in a fresh process so that background threads started
+by a sample (e.g. the synsation charger) cannot leak into the next
+measurement. The peak RSS of a scenario is the high-water mark of its own
+process (VmHWM), reset before the sample starts. Where /proc is not
+available it falls back to ru_maxrss, which on some platforms includes
+the memory of the parent at the time the process was started.
+"""
+
+# pylint:  disable=missing-docstring
+
+import argparse
+from importlib import import_module
+import importlib.resources as res
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from archivist import about as archivist_about
+
+from archivist_samples.testing.event_template import ENCODING
+from archivist_samples.testing.parser import common_endpoint
+from archivist_samples.testing.stand_in import StandInServer
+
+from .recorder import Recorder
+from .scenarios import scenarios
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on windows
+    resource = None
+
+LOGGER = logging.getLogger(__name__)
+
+
+def reset_peak_rss():
+    """Start the high-water mark of the RSS of this process afresh"""
+    try:
+        with open("/proc/self/clear_refs", mode="w", encoding="utf-8") as fd:
+            fd.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    try:
+        with open("/proc/self/status", mode="r", encoding="utf-8") as fd:
+            for line in fd:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macos reports bytes, linux reports kilobytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_scenario(scenario, argv, namespace, verbose, conn):
+    """Entry point of the child process"""
+    parser = import_module(scenario.parser).make_parser()
+    args = parser.parse_args([*argv, *scenario.argv])
+    args.namespace = namespace
+
+    module, function = scenario.run.split(":")
+    run = getattr(import_module(module), function)
+    reset_peak_rss()
+
+    recorder = Recorder()
+    error = None
+    with recorder.installed():
+        arch = common_endpoint(scenario.label, args)
+        if not verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+
+        start = perf_counter()
+        try:
+            code = run(arch, args)
+        except SystemExit as ex:
+            code = ex.code
+        except Exception as ex:  # pylint: disable=broad-exception-caught
+            code = 1
+            error = repr(ex)
+
+        wall_time = perf_counter() - start
+
+    operations = recorder.summary()
+    result = {
+        "exit_code": code or 0,
+        "error": error,
+        "wall_time_s": round(wall_time, 3),
+        "peak_rss_kb": peak_rss_kb(),
+        "http_calls": sum(o["calls"] for o in operations.values()),
+        "operations": operations,
+    }
+    if ENCODING.enabled:
+        result["encoding"] = ENCODING.summary()
+
+    conn.send(result)
+    conn.close()
+
+
+def missing_files(scenario):
+    return [
+        name
+        for package, name in scenario.requires
+        if not res.files(package).joinpath(name).is_file()
+    ]
+
+
+def run_all(selected, argv, namespace, args):
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for scenario in selected:
+        missing = missing_files(scenario)
+        if missing:
+            LOGGER.warning("Skipping %s: missing %s", scenario.name, ", ".join(missing))
+            results[scenario.name] = {
+                "exit_code": 0,
+                "error": None,
+                "skipped": f"missing {', '.join(missing)}",
+            }
+            continue
+
+        LOGGER.info("Running %s...", scenario.name)
+        receiver, sender = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=run_scenario,
+            args=(scenario, argv, namespace, args.verbose, sender),
+        )
+        process.start()
+        sender.close()
+        if receiver.poll(args.timeout):
+            results[scenario.name] = receiver.recv()
+        else:
+            results[scenario.name] = {"exit_code": 1, "error": "timed out"}
+
+        process.terminate()
+        process.join()
+
+        result = results[scenario.name]
+        LOGGER.info(
+            "%s: %s in %ss with %s HTTP calls",
+            scenario.name,
+            "FAILED" if result["exit_code"] or result["error"] else "ok",
+            result.get("wall_time_s"),
+            result.get("http_calls"),
+        )
+
+    return results
+
+
+def compare(baseline, report):
+    """Print the change in wall time and HTTP calls against a previous report"""
+    print(f"{'scenario':<24} {'wall time (s)':>24} {'HTTP calls':>20}")
+    for name, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None or "wall_time_s" not in old or "wall_time_s" not in result:
+            print(f"{name:<24} {'-':>24} {'-':>20}")
+            continue
+
+        change = (
+            (result["wall_time_s"] - old["wall_time_s"]) * 100.0 / old["wall_time_s"]
+            if old["wall_time_s"]
+            else 0.0
+        )
+        wall = f"{old['wall_time_s']} -> {result['wall_time_s']} ({change:+.0f}%)"
+        calls = f"{old['http_calls']} -> {result['http_calls']}"
+        print(f"{name:<24} {wall:>24} {calls:>20}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the samples against a local stand-in or DataTrails",
+    )
+    parser.add_argument(
+        "-u",
+        "--url",
+        type=str,
+        dest="url",
+        action="store",
+        help="url of Archivist service (default: start a local stand-in)",
+    )
+    parser.add_argument(
+        "-t",
+        "--auth-token",
+        type=str,
+        dest="auth_token_file",
+        action="store",
+        help="FILE containing API authentication token (required with --url)",
+    )
+    parser.add_argument(
+        "--namespace",
+        type=str,
+        dest="namespace",
+        action="store",
+        help="namespace of created assets (default: bench_<epoch seconds>)",
+    )
+    parser.add_argument(
+        "-s",
+        "--select",
+        type=lambda s: s.split(","),
+        dest="select",
+        action="store",
+        help="comma-separated list of scenarios to run (default: all)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        dest="output",
+        action="store",
+        help="write the JSON report to FILE (default: stdout)",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=str,
+        dest="baseline",
+        action="store",
+        help="compare against a JSON report from a previous run",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        dest="latency",
+        action="store",
+        default=0.0,
+        help="seconds added to every stand-in response",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        dest="jitter",
+        action="store",
+        default=0.0,
+        help="up to this many random seconds added to the stand-in latency",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        dest="error_rate",
+        action="store",
+        default=0.0,
+        help="fraction of stand-in requests that are throttled (429)",
+    )
+    parser.add_argument(
+        "--charger-seconds",
+        type=float,
+        dest="charger_seconds",
+        action="store",
+        default=10.0,
+        help="how long the synsation charger simulation runs",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        dest="timeout",
+        action="store",
+        default=600.0,
+        help="seconds before a scenario is abandoned",
+    )
+    parser.add_argument(
+        "--profile-encoding",
+        dest="profile_encoding",
+        action="store_true",
+        default=False,
+        help="report how long the samples took to encode their events",
+    )
+    parser.add_argument(
+        "-l",
+        "--list",
+        dest="list_scenarios",
+        action="store_true",
+        default=False,
+        help="list the scenarios and exit",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        default=False,
+        help="show the output of the samples",
+    )
+    args = parser.parse_args()
+    if args.url and not args.auth_token_file:
+        parser.error("--auth-token is required with --url")
+
+    return args
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    available = scenarios(args.charger_seconds)
+    if args.list_scenarios:
+        for scenario in available:
+            print(scenario.name)
+        return 0
+
+    selected = [s for s in available if not args.select or s.name in args.select]
+    namespace = args.namespace or f"bench_{int(time())}"
+
+    with TemporaryDirectory() as workdir:
+        # signed_records writes its keys to the current directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        server = None
+        try:
+            if args.url:
+                url = args.url
+                token = os.path.join(cwd, args.auth_token_file)
+            else:
+                server = StandInServer(
+                    latency=args.latency,
+                    jitter=args.jitter,
+                    error_rate=args.error_rate,
+                ).start()
+                url = server.url
+                token = os.path.join(workdir, "auth_token")
+                with open(token, mode="w", encoding="utf-8") as fd:
+                    fd.write("stand-in")
+
+            argv = ["-u", url, "-t", token]
+            if args.profile_encoding:
+                argv.append("--profile-encoding")
+
+            results = run_all(selected, argv, namespace, args)
+
+        finally:
+            if server is not None:
+                server.stop()
+            os.chdir(cwd)
+
+    report = {
+        "backend": args.url or "stand-in",
+        "datatrails_archivist": archivist_about.__version__,
+        "python": platform.python_version(),
+        "namespace": namespace,
+        "scenarios": results,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, mode="w", encoding="utf-8") as fd:
+            fd.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, mode="r", encoding="utf-8") as fd:
+            compare(json.load(fd), report)
+
+    failed = [n for n, r in results.items() if r["exit_code"] or r["error"]]
+    if failed:
+        LOGGER.error("Failed scenarios: %s", ", ".join(failed))
+        return 1
+
+    return 0
@@ -0,0 +1,260 @@
+"""The sample entry points that are benchmarked and the arguments they get.
+
+Scenarios run in the order given here as later ones depend on assets
+created by earlier ones (e.g. the synsation charger needs the chargers made
+by synsation initialise).
+
+The arguments are parsed by the sample's own parser, as if given on the
+command line, so the options a scenario does not set keep the sample's
+defaults.
+"""
+
+# pylint:  disable=missing-docstring
+
+from dataclasses import dataclass, field
+import datetime
+
+START_DATE = datetime.datetime(2019, 9, 9)
+
+
+def day(days=0):
+    """Command line form of the date days after START_DATE"""
+    return (START_DATE + datetime.timedelta(days=days)).strftime("%Y%m%d")
+
+
+@dataclass
+class Scenario:
+    name: str
+    label: str  # namespace label passed to common_endpoint
+    run: str  # module:function called as function(arch, args)
+    parser: str  # module whose make_parser() parses the arguments
+    argv: list = field(default_factory=list)
+    # (package, name) of the packaged files the sample needs. The scenario
+    # is skipped if any is missing.
+    requires: tuple = ()
+
+
+def scenarios(charger_seconds):
+    """All scenarios. The charger runs for about charger_seconds"""
+    synsation_dates = ["--start-date", day(), "--fast-forward", "3600"]
+    charger_day = [
+        "--airport",
+        "SJC",
+        "--start-date",
+        day(),
+        "--stop-date",
+        day(1),
+        "--fast-forward",
+        str(86400 / charger_seconds),
+        "--recall-workers",
+        "8",
+    ]
+    return [
+        Scenario(
+            "door_entry_create",
+            "door_entry",
+            "archivist_samples.door_entry.run:run",
+            "archivist_samples.door_entry.main",
+            ["--create"],
+        ),
+        Scenario(
+            "door_entry_list",
+            "door_entry",
+            "archivist_samples.door_entry.run:run",
+            "archivist_samples.door_entry.main",
+            ["--list", "all"],
+        ),
+        Scenario(
+            "door_entry_open",
+            "door_entry",
+            "archivist_samples.door_entry.run:run",
+            "archivist_samples.door_entry.main",
+            ["--open-door", "Bastille front door,access_card_2"],
+        ),
+        Scenario(
+            "wipp",
+            "wipp",
+            "archivist_samples.wipp.run:run",
+            "archivist_samples.wipp.main",
+        ),
+        Scenario(
+            "document",
+            "document",
+            "archivist_samples.document.run:run",
+            "archivist_samples.document.main",
+            requires=(
+                (
+                    "archivist_samples.document.document_files",
+                    "DocumentPrimaryImage.jpg",
+                ),
+            ),
+        ),
+        Scenario(
+            "c2pa",
+            "c2pa",
+            "archivist_samples.c2pa.run:run",
+            "archivist_samples.c2pa.main",
+        ),
+        Scenario(
+            "sbom",
+            "sbom",
+            "archivist_samples.sbom_document.run:run",
+            "archivist_samples.sbom_document.main",
+        ),
+        Scenario(
+            "signed_records_create",
+            "signed_records",
+            "archivist_samples.signed_records.main:run",
+            "archivist_samples.signed_records.main",
+            ["--create", "signed-records"],
+        ),
+        Scenario(
+            "signed_records_sign",
+            "signed_records",
+            "archivist_samples.signed_records.main:run",
+            "archivist_samples.signed_records.main",
+            ["--sign-message", "benchmark", "signed-records"],
+        ),
+        Scenario(
+            "signed_records_check",
+            "signed_records",
+            "archivist_samples.signed_records.main:run",
+            "archivist_samples.signed_records.main",
+            ["--check", "signed-records"],
+        ),
+        Scenario(
+            "synsation_initialise",
+            "synsation",
+            "archivist_samples.synsation.initialise:run",
+            "archivist_samples.synsation.initialise",
+            ["--num-assets", "50", "--await-confirmation"],
+        ),
+        Scenario(
+            "synsation_initialise_parallel",
+            "synsation",
+            "archivist_samples.synsation.initialise:run",
+            "archivist_samples.synsation.initialise",
+            [
+                "--num-assets",
+                "50",
+                "--await-confirmation",
+                "--jobs",
+                "4",
+                "--parallel",
+                "4",
+            ],
+        ),
+        Scenario(
+            "synsation_simulator",
+            "synsation",
+            "archivist_samples.synsation.simulator:run",
+            "archivist_samples.synsation.simulator",
+            ["--asset-name", "tcl.ccj.001", "--wait", "0.001", *synsation_dates],
+        ),
+        Scenario(
+            "synsation_simulator_flows",
+            "synsation",
+            "archivist_samples.synsation.simulator:run",
+            "archivist_samples.synsation.simulator",
+            [
+                "--display-type",
+                "Traffic light with violation camera",
+                "--jobs",
+                "8",
+                "--seed",
+                "1",
+                *synsation_dates,
+            ],
+        ),
+        Scenario(
+            "synsation_wanderer",
+            "synsation",
+            "archivist_samples.synsation.wanderer:run",
+            "archivist_samples.synsation.wanderer",
+            ["--wait", "0.001", *synsation_dates],
+        ),
+        Scenario(
+            "synsation_wanderer_fleet",
+            "synsation",
+            "archivist_samples.synsation.wanderer:run",
+            "archivist_samples.synsation.wanderer",
+            [
+                "--crates",
+                "0",
+                "--virtual-time",
+                "--seed",
+                "1",
+                "--wait",
+                "0.001",
+                *synsation_dates,
+            ],
+        ),
+        Scenario(
+            "synsation_wanderer_async",
+            "synsation",
+            "archivist_samples.synsation.wanderer:run",
+            "archivist_samples.synsation.wanderer",
+            ["--crates", "0", "--async", "--wait", "0.001", *synsation_dates],
+        ),
+        Scenario(
+            "synsation_charger",
+            "synsation",
+            "archivist_samples.synsation.charger:run",
+            "archivist_samples.synsation.charger",
+            charger_day,
+        ),
+        Scenario(
+            "synsation_charger_pooled",
+            "synsation",
+            "archivist_samples.synsation.charger:run",
+            "archivist_samples.synsation.charger",
+            [*charger_day, "--workers", "4"],
+        ),
+        # only the HTTP calls of the coordinating process are recorded
+        Scenario(
+            "synsation_charger_sharded",
+            "synsation",
+            "archivist_samples.synsation.charger:run",
+            "archivist_samples.synsation.charger",
+            [*charger_day, "--workers", "4", "--shards", "2"],
+        ),
+        Scenario(
+            "synsation_charger_virtual",
+            "synsation",
+            "archivist_samples.synsation.charger:run",
+            "archivist_samples.synsation.charger",
+            [
+                "--airport",
+                "SJC",
+                "--start-date",
+                day(),
+                "--stop-date",
+                day(7),
+                "--virtual-time",
+                "--seed",
+                "1",
+                "--recall-workers",
+                "8",
+            ],
+        ),
+        Scenario(
+            "synsation_analyze",
+            "synsation",
+            "archivist_samples.synsation.analyze:run",
+            "archivist_samples.synsation.analyze",
+        ),
+        Scenario(
+            "estate_info_quick",
+            "estate_info",
+            "archivist_samples.estate_info.main:run",
+            "archivist_samples.estate_info.main",
+            ["--quick-count"],
+        ),
+        Scenario(
+            "estate_info_double",
+            "estate_info",
+            "archivist_samples.estate_info.main:run",
+            "archivist_samples.estate_info.main",
+            ["--double-check"],
+        ),
+    ]